@@ -0,0 +1,164 @@
+'''Offline Torsel benchmark.
+Runs Torsel against the fake tor executable and the fake WebDriver, so no tor, browser
+or Internet access is needed, and reports for each combination of instances and threads:
+	startup: seconds until the first action completed (bootstrap and first browser launch included)
+	throughput: actions per second between the first and the last completed action
+	cleanup: seconds between the last completed action and the end of the run
+	fairness: Jain's fairness index of the number of actions served by each instance (1.0 is perfectly even)
+Usage:
+	python benchmarks/bench.py --instances 1 4 8 --threads 4 8 --actions 200
+	python benchmarks/bench.py --mode http --instances-per-process 4 --json results.json'''
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from os.path import join, abspath, dirname
+from argparse import ArgumentParser
+from tempfile import mkdtemp
+from threading import Thread
+from itertools import product
+from collections import Counter
+from shutil import rmtree
+from json import dump
+from os import environ, chmod
+from time import time
+import sys
+
+BENCH_DIR = dirname(abspath(__file__))
+sys.path.insert(0, dirname(BENCH_DIR))
+import fake_driver
+from fake_driver import FakeDriver
+from torsel import Torsel
+
+class PageHandler(BaseHTTPRequestHandler):
+	'''PageHandler:
+	Serves a tiny page to the browserless actions, reached through the fake tor SOCKS ports.'''
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		body = b'ok'
+		self.send_response(200)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+def fake_tor_executable(work_dir):
+	'''Writes an executable wrapper that runs fake_tor.py with the current interpreter.
+	Args:
+		work_dir (str): The directory to write the wrapper into.
+	Returns:
+		str: The path to the wrapper, to be used as tor_path.'''
+	path = join(work_dir, 'tor')
+	with open(path, 'w') as wrapper:
+		wrapper.write(f'#!/bin/sh\nexec "{sys.executable}" "{join(BENCH_DIR, "fake_tor.py")}" "$@"\n')
+	chmod(path, 0o755)
+	return path
+
+def fairness(counts):
+	'''Returns Jain's fairness index of a list of counts.
+	Args:
+		counts (list): The number of actions served by each instance.
+	Returns:
+		float: 1.0 if every instance served the same number of actions, down to 1/len(counts).'''
+	if not counts or not any(counts):
+		return 0.0
+	return sum(counts) ** 2 / (len(counts) * sum(count * count for count in counts))
+
+def bench(args, instances, threads, tor_path, work_dir, page_url):
+	'''Runs one benchmark case.
+	Args:
+		args (Namespace): The command line arguments.
+		instances (int): The number of Tor instances.
+		threads (int): The number of worker threads.
+		tor_path (str): The path to the fake tor executable.
+		work_dir (str): The directory to keep the Tor data directories in.
+		page_url (str): The URL of the local page fetched by browserless actions.
+	Returns:
+		dict: The measurements of the case.'''
+	torsel = Torsel(
+		total_instances=instances,
+		max_threads=threads,
+		tor_path=tor_path,
+		tor_data_dir=join(work_dir, f'tor_{instances}_{threads}'),
+		headless=True,
+		auto_ports=True,
+		reuse_drivers=args.reuse_drivers,
+		prelaunch_drivers=args.prelaunch_drivers,
+		instances_per_process=args.instances_per_process,
+		rotation_timeout=max(1, 5 * args.newnym),
+		driver_factory=FakeDriver)
+	if args.mode == 'http':
+		action = lambda http: http.request('GET', page_url).status
+	else:
+		action = lambda driver: driver.get(page_url)
+	served = Counter()
+	errors = 0
+	first = last = None
+	start = time()
+	for _, instance_num, result, _ in torsel.imap(args.actions, action):
+		last = time()
+		first = first or last
+		served[instance_num] += 1
+		errors += isinstance(result, Exception)
+	end = time()
+	phases = torsel.metrics.snapshot()['phases']
+	mean = lambda phase: phases[phase]['total']['sum'] / phases[phase]['total']['count'] if phase in phases else None
+	return {
+		'instances': instances,
+		'threads': threads,
+		'actions': args.actions,
+		'errors': errors,
+		'startup': (first or end) - start,
+		'throughput': (args.actions - 1) / (last - first) if last and last > first else None,
+		'cleanup': end - (last or end),
+		'total': end - start,
+		'fairness': fairness([served.get(n, 0) for n in range(instances)]),
+		'mean_bootstrap': mean('bootstrap'),
+		'mean_rotation': mean('rotation'),
+		'mean_driver_launch': mean('driver_launch')
+	}
+
+def main():
+	parser = ArgumentParser(description='Offline Torsel orchestration benchmark.')
+	parser.add_argument('--instances', type=int, nargs='+', default=[1, 4], help='Numbers of Tor instances to benchmark.')
+	parser.add_argument('--threads', type=int, nargs='+', default=[1, 4], help='Numbers of worker threads to benchmark.')
+	parser.add_argument('--actions', type=int, default=100, help='Number of actions per case.')
+	parser.add_argument('--mode', choices=['browser', 'http'], default='browser', help='Run actions with the fake browser or the http session.')
+	parser.add_argument('--bootstrap', type=float, default=0.5, help='Fake tor bootstrap latency in seconds.')
+	parser.add_argument('--newnym', type=float, default=0.2, help='Fake tor NEWNYM latency in seconds.')
+	parser.add_argument('--launch', type=float, default=0.5, help='Fake browser launch latency in seconds.')
+	parser.add_argument('--get', type=float, default=0.1, help='Fake browser page load latency in seconds.')
+	parser.add_argument('--quit', type=float, default=0.05, help='Fake browser quit latency in seconds.')
+	parser.add_argument('--instances-per-process', type=int, default=1, help='Instances served by each fake tor process.')
+	parser.add_argument('--reuse-drivers', action='store_true', help='Keep browsers warm across actions.')
+	parser.add_argument('--prelaunch-drivers', action='store_true', help='Launch the next browser in the background.')
+	parser.add_argument('--json', help='Write the results to this JSON file.')
+	args = parser.parse_args()
+	environ['FAKE_TOR_BOOTSTRAP'] = str(args.bootstrap)
+	environ['FAKE_TOR_NEWNYM'] = str(args.newnym)
+	fake_driver.LAUNCH_LATENCY = args.launch
+	fake_driver.GET_LATENCY = args.get
+	fake_driver.QUIT_LATENCY = args.quit
+	server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+	Thread(target=server.serve_forever, daemon=True).start()
+	page_url = f'http://127.0.0.1:{server.server_address[1]}/'
+	work_dir = mkdtemp(prefix='torsel_bench_')
+	results = []
+	try:
+		tor_path = fake_tor_executable(work_dir)
+		print(f'{"instances":>9} {"threads":>7} {"errors":>6} {"startup":>8} {"actions/s":>9} {"cleanup":>8} {"fairness":>8}')
+		for instances, threads in product(args.instances, args.threads):
+			result = bench(args, instances, threads, tor_path, work_dir, page_url)
+			results.append(result)
+			throughput = f'{result["throughput"]:9.2f}' if result['throughput'] else f'{"-":>9}'
+			print(f'{instances:>9} {threads:>7} {result["errors"]:>6} {result["startup"]:8.2f} {throughput} {result["cleanup"]:8.2f} {result["fairness"]:8.3f}')
+	finally:
+		server.shutdown()
+		rmtree(work_dir, ignore_errors=True)
+	if args.json:
+		with open(args.json, 'w') as output:
+			dump(results, output, indent=2)
+
+if __name__ == '__main__':
+	main()
+# by azuk4r
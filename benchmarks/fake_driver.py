@@ -0,0 +1,139 @@
+'''Fake WebDriver - a stand-in browser for offline Torsel benchmarks.
+Pass FakeDriver as the driver_factory of a Torsel object. It implements the WebDriver calls Torsel makes
+(including the DevTools browser contexts used by reuse_drivers) and simulates browser latencies
+configured through the environment:
+	FAKE_DRIVER_LAUNCH (float): Seconds to launch a browser.
+	FAKE_DRIVER_GET (float): Seconds to load a page.
+	FAKE_DRIVER_QUIT (float): Seconds to quit a browser.'''
+from itertools import count
+from re import fullmatch, escape
+from urllib.parse import urlsplit
+from json import dumps
+from os import environ
+from time import sleep
+
+LAUNCH_LATENCY = float(environ.get('FAKE_DRIVER_LAUNCH', '0.5'))
+GET_LATENCY = float(environ.get('FAKE_DRIVER_GET', '0.1'))
+QUIT_LATENCY = float(environ.get('FAKE_DRIVER_QUIT', '0.05'))
+
+def glob_match(pattern, value):
+	'''Matches a whole value against a pattern where only * is a wildcard.'''
+	return fullmatch('.*'.join(map(escape, pattern.split('*'))), value) is not None
+
+def legacy_match(pattern, url):
+	'''Matches a URL the way Chrome matches the legacy urls of Network.setBlockedURLs:
+	the pieces between the * wildcards are found in order anywhere in the URL, nothing is anchored.'''
+	position = 0
+	for piece in pattern.split('*'):
+		position = url.find(piece, position)
+		if position < 0:
+			return False
+		position += len(piece)
+	return True
+
+def url_pattern_match(pattern, url):
+	'''Matches a URL against a URLPattern constructor string, as in the urlPatterns of Network.setBlockedURLs.
+	Only the protocol://hostname:port/pathname?search form with * wildcards is supported, each component
+	is matched on its own and an omitted component matches anything.'''
+	components = fullmatch(r'(?P<protocol>[^:]*)://(?P<hostname>[^:/]*)(?::(?P<port>[^/]*))?(?P<pathname>/[^?#]*)(?:\?(?P<search>[^#]*))?', pattern)
+	parts = urlsplit(url)
+	values = {'protocol': parts.scheme, 'hostname': parts.hostname or '', 'port': str(parts.port or ''),
+		'pathname': parts.path or '/', 'search': parts.query}
+	return all(glob_match(components[name] or '*', value) for name, value in values.items())
+
+class FakeSwitchTo:
+	'''FakeSwitchTo:
+	The switch_to helper of a FakeDriver.'''
+	def __init__(self, driver):
+		self.driver = driver
+
+	def window(self, handle):
+		self.driver.current_window_handle = handle
+
+class FakeDriver:
+	'''FakeDriver:
+	Records what Torsel does with a browser without running one.'''
+	ids = count()
+	# Chrome versions older than the urlPatterns of Network.setBlockedURLs reject them
+	supports_url_patterns = True
+
+	def __init__(self, options=None):
+		'''Launches the fake browser.
+		Args:
+			options (Options): The Chrome options configured by Torsel.'''
+		sleep(LAUNCH_LATENCY)
+		self.id = next(self.ids)
+		self.arguments = list(options.arguments) if options else []
+		self.handles = ['tab0']
+		self.current_window_handle = 'tab0'
+		self.current_url = 'about:blank'
+		self.cookies = []
+		self.pages = 0
+		self.contexts = count(1)
+		self.blocked_urls = []
+		self.url_patterns = []
+		self.performance = []
+		self.switch_to = FakeSwitchTo(self)
+
+	@property
+	def window_handles(self):
+		return list(self.handles)
+
+	@property
+	def page_source(self):
+		return f'<html><body>{self.current_url}</body></html>'
+
+	def get(self, url):
+		if (any(legacy_match(pattern, url) for pattern in self.blocked_urls)
+				or any(url_pattern_match(pattern, url) for pattern in self.url_patterns)):
+			self.log_network('Network.loadingFailed', {'blockedReason': 'inspector'})
+			return
+		sleep(GET_LATENCY)
+		self.current_url = url
+		self.pages += 1
+		self.log_network('Network.loadingFinished', {'encodedDataLength': len(self.page_source)})
+
+	def log_network(self, method, params):
+		self.performance.append({'message': dumps({'message': {'method': method, 'params': params}})})
+
+	def get_log(self, log_type):
+		messages, self.performance = self.performance, []
+		return messages
+
+	def refresh(self):
+		self.get(self.current_url)
+
+	def execute_script(self, script, *args):
+		if 'readyState' in script:
+			return 'complete'
+		return None
+
+	def execute_cdp_cmd(self, cmd, params):
+		if cmd == 'Target.createBrowserContext':
+			return {'browserContextId': f'context{next(self.contexts)}'}
+		if cmd == 'Target.createTarget':
+			handle = f'tab{len(self.handles)}-{next(self.contexts)}'
+			self.handles.append(handle)
+			return {'targetId': handle}
+		if cmd == 'Network.setBlockedURLs':
+			if 'urlPatterns' in params and not self.supports_url_patterns:
+				raise ValueError('Invalid parameters: urls: array expected')
+			self.blocked_urls = list(params.get('urls', ()))
+			self.url_patterns = [pattern['urlPattern'] for pattern in params.get('urlPatterns', ()) if pattern['block']]
+		if cmd == 'Network.setCookies':
+			self.cookies.extend(params['cookies'])
+		return {}
+
+	def add_cookie(self, cookie):
+		self.cookies.append(cookie)
+
+	def delete_all_cookies(self):
+		self.cookies.clear()
+
+	def close(self):
+		self.handles.remove(self.current_window_handle)
+
+	def quit(self):
+		sleep(QUIT_LATENCY)
+		self.handles = []
+# by azuk4r
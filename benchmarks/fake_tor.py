@@ -0,0 +1,314 @@
+'''Fake tor - a stand-in tor executable for offline Torsel benchmarks.
+It understands the subset of the torrc and control-port protocol that Torsel uses,
+and runs a real SOCKS5 listener that connects directly to the requested target.
+Latencies are configured through the environment:
+	FAKE_TOR_BOOTSTRAP (float): Seconds until bootstrap reaches 100%.
+	FAKE_TOR_NEWNYM (float): Seconds between NEWNYM and the CIRC BUILT event.
+	FAKE_TOR_RELAYS (int): Number of distinct relays circuits are built from.
+Usage:
+	python fake_tor.py -f /path/to/torrc'''
+from socketserver import ThreadingTCPServer, StreamRequestHandler, BaseRequestHandler
+from socket import create_connection, inet_ntoa
+from threading import Thread, Lock
+from os.path import join, exists
+from itertools import count
+from struct import unpack
+from base64 import b64encode
+from os import environ, getpid
+from time import time, sleep
+from random import Random
+import signal
+import sys
+
+BOOTSTRAP_LATENCY = float(environ.get('FAKE_TOR_BOOTSTRAP', '0.5'))
+NEWNYM_LATENCY = float(environ.get('FAKE_TOR_NEWNYM', '0.2'))
+RELAYS = int(environ.get('FAKE_TOR_RELAYS', '5000'))
+
+class FakeTor:
+	'''FakeTor:
+	Process-wide state shared by the control and SOCKS listeners.'''
+	def __init__(self, torrc_path):
+		self.started = time()
+		self.lock = Lock()
+		self.circ_ids = count(1)
+		self.stream_ids = count(1)
+		self.random = Random(getpid())
+		self.controllers = []
+		self.socks_ports = []
+		self.control_port = None
+		self.data_dir = None
+		self.control_port_file = None
+		self.pid_file = None
+		self.session_circuits = {}
+		self.circuits = {}
+		self.conf = {}
+		self.parse_torrc(torrc_path)
+
+	def parse_torrc(self, torrc_path):
+		'''Reads the torrc options Torsel writes.'''
+		with open(torrc_path) as torrc:
+			for line in torrc:
+				parts = line.strip().split()
+				if not parts or parts[0].startswith('#'):
+					continue
+				key, args = parts[0], parts[1:]
+				if key == 'SocksPort':
+					self.socks_ports.append(args)
+				elif key == 'ControlPort':
+					self.control_port = args[0]
+				elif key == 'DataDirectory':
+					self.data_dir = args[0]
+				elif key == 'ControlPortWriteToFile':
+					self.control_port_file = args[0]
+				elif key == 'PidFile':
+					self.pid_file = args[0]
+				else:
+					self.conf[key] = ' '.join(args)
+
+	def progress(self):
+		'''Returns the current bootstrap percentage.'''
+		if BOOTSTRAP_LATENCY <= 0:
+			return 100
+		return min(100, int(100 * (time() - self.started) / BOOTSTRAP_LATENCY))
+
+	def relay(self):
+		'''Returns a random (fingerprint, nickname, address) relay.'''
+		n = self.random.randrange(1, RELAYS + 1)
+		return (f'{n:040X}', f'relay{n}', f'10.{n // 256 % 256}.{n % 256}.{n % 7 + 1}')
+
+	def build_circuit(self, session_group, announce=None):
+		'''Builds a new general circuit for a session group and announces it.
+		A session group of None builds a circuit no stream is attached to.'''
+		with self.lock:
+			circ_id = next(self.circ_ids)
+		if announce:
+			announce(circ_id)
+		self.emit('CIRC', f'650 CIRC {circ_id} LAUNCHED BUILD_FLAGS=NEED_CAPACITY PURPOSE=GENERAL')
+		with self.lock:
+			path = [self.relay() for _ in range(3)]
+			self.circuits[circ_id] = path
+			if session_group is not None:
+				self.session_circuits[session_group] = circ_id
+		path_str = ','.join(f'${fp}~{nick}' for fp, nick, _ in path)
+		self.emit('CIRC', f'650 CIRC {circ_id} BUILT {path_str} BUILD_FLAGS=NEED_CAPACITY PURPOSE=GENERAL TIME_CREATED=2024-01-01T00:00:00.000000')
+		return circ_id
+
+	def circuit_for(self, session_group):
+		'''Returns the circuit streams of a session group are attached to.'''
+		with self.lock:
+			circ_id = self.session_circuits.get(session_group)
+		return circ_id if circ_id is not None else self.build_circuit(session_group)
+
+	def newnym(self):
+		'''Marks every circuit dirty and announces fresh circuits after the latency.'''
+		def finish():
+			sleep(NEWNYM_LATENCY)
+			with self.lock:
+				groups = list(self.session_circuits) or [0]
+				self.session_circuits.clear()
+			for group in groups:
+				self.build_circuit(group)
+		Thread(target=finish, daemon=True).start()
+
+	def close_circuit(self, circ_id):
+		'''Closes a circuit so its session group builds a new one.'''
+		with self.lock:
+			if circ_id not in self.circuits:
+				return False
+			for group, circ in list(self.session_circuits.items()):
+				if circ == circ_id:
+					del self.session_circuits[group]
+		self.emit('CIRC', f'650 CIRC {circ_id} CLOSED REASON=REQUESTED')
+		return True
+
+	def emit(self, event_type, line):
+		'''Sends an asynchronous event to every subscribed controller.'''
+		for handler in list(self.controllers):
+			if event_type in handler.events:
+				handler.send(line)
+
+	def relay_address(self, fingerprint):
+		'''Looks up the address of a relay on any known circuit.'''
+		for path in self.circuits.values():
+			for fp, nick, address in path:
+				if fp == fingerprint:
+					return nick, address
+		return None
+
+class ControlHandler(StreamRequestHandler):
+	'''ControlHandler:
+	Speaks the subset of the tor control protocol used by stem and Torsel.'''
+	def setup(self):
+		super().setup()
+		self.events = set()
+		self.send_lock = Lock()
+		tor.controllers.append(self)
+
+	def finish(self):
+		tor.controllers.remove(self)
+		super().finish()
+
+	def send(self, text):
+		with self.send_lock:
+			try:
+				self.wfile.write((text + '\r\n').encode())
+				self.wfile.flush()
+			except OSError:
+				pass
+
+	def handle(self):
+		for raw in self.rfile:
+			line = raw.decode().strip()
+			if not line:
+				continue
+			command, _, args = line.partition(' ')
+			command = command.upper()
+			if command == 'PROTOCOLINFO':
+				self.send('250-PROTOCOLINFO 1\r\n250-AUTH METHODS=NULL\r\n250-VERSION Tor="0.4.8.10"\r\n250 OK')
+			elif command == 'GETINFO':
+				self.getinfo(args.split())
+			elif command == 'SIGNAL':
+				if args.upper() == 'NEWNYM':
+					tor.newnym()
+				self.send('250 OK')
+			elif command == 'SETEVENTS':
+				self.events = set(args.upper().split())
+				self.send('250 OK')
+			elif command == 'EXTENDCIRCUIT':
+				# A new circuit replaces the one of session group 0 if it was closed
+				group = None if 0 in tor.session_circuits else 0
+				tor.build_circuit(group, announce=lambda circ_id: self.send(f'250 EXTENDED {circ_id}'))
+			elif command == 'CLOSECIRCUIT':
+				circ_id = int(args.split()[0])
+				self.send('250 OK' if tor.close_circuit(circ_id) else '552 Unknown circuit')
+			elif command == 'QUIT':
+				self.send('250 closing connection')
+				return
+			else:
+				self.send('250 OK')
+
+	def getinfo(self, keys):
+		lines = []
+		for key in keys:
+			if key == 'status/bootstrap-phase':
+				progress = tor.progress()
+				tag = 'done' if progress == 100 else 'loading_descriptors'
+				lines.append(f'250-{key}=NOTICE BOOTSTRAP PROGRESS={progress} TAG={tag} SUMMARY="Fake"')
+			elif key == 'version':
+				lines.append(f'250-{key}=0.4.8.10')
+			elif key == 'net/listeners/socks':
+				lines.append(f'250-{key}=' + ' '.join(f'"127.0.0.1:{port}"' for port in socks_listeners))
+			elif key == 'net/listeners/control':
+				lines.append(f'250-{key}="127.0.0.1:{control_server.server_address[1]}"')
+			elif key == 'circuit-status':
+				body = []
+				for circ_id in sorted(set(tor.session_circuits.values())):
+					path = ','.join(f'${fp}~{nick}' for fp, nick, _ in tor.circuits[circ_id])
+					body.append(f'{circ_id} BUILT {path} PURPOSE=GENERAL')
+				lines.append(f'250+{key}=\r\n' + '\r\n'.join(body) + '\r\n.')
+			elif key.startswith('ns/id/'):
+				found = tor.relay_address(key[6:].lstrip('$'))
+				if not found:
+					self.send(f'552 Unrecognized key "{key}"')
+					return
+				nick, address = found
+				identity = b64encode(bytes.fromhex(key[6:].lstrip('$'))).decode().rstrip('=')
+				lines.append(f'250+{key}=\r\nr {nick} {identity} {identity} 2024-01-01 00:00:00 {address} 9001 0\r\ns Exit Fast Running Valid\r\n.')
+			else:
+				self.send(f'552 Unrecognized key "{key}"')
+				return
+		self.send('\r\n'.join(lines + ['250 OK']))
+
+class SocksHandler(BaseRequestHandler):
+	'''SocksHandler:
+	A minimal SOCKS5 CONNECT proxy that reports each stream as a tor STREAM event.'''
+	def handle(self):
+		sock = self.request
+		session_group = self.server.session_group
+		try:
+			nmethods = sock.recv(2)[1]
+			sock.recv(nmethods)
+			sock.sendall(b'\x05\x00')
+			header = sock.recv(4)
+			atyp = header[3]
+			if atyp == 1:
+				host = inet_ntoa(sock.recv(4))
+			elif atyp == 3:
+				host = sock.recv(sock.recv(1)[0]).decode()
+			else:
+				sock.sendall(b'\x05\x08\x00\x01' + b'\x00' * 6)
+				return
+			port = unpack('>H', sock.recv(2))[0]
+			circ_id = tor.circuit_for(session_group)
+			stream_id = next(tor.stream_ids)
+			# Like tor, report the stream on its circuit before the SOCKS reply
+			tor.emit('STREAM', f'650 STREAM {stream_id} SENTCONNECT {circ_id} {host}:{port} SESSION_GROUP={session_group}')
+			try:
+				upstream = create_connection((host, port), timeout=10)
+			except OSError:
+				sock.sendall(b'\x05\x05\x00\x01' + b'\x00' * 6)
+				tor.emit('STREAM', f'650 STREAM {stream_id} FAILED {circ_id} {host}:{port} REASON=CONNECTREFUSED')
+				return
+			sock.sendall(b'\x05\x00\x00\x01' + b'\x00' * 6)
+			tor.emit('STREAM', f'650 STREAM {stream_id} SUCCEEDED {circ_id} {host}:{port} SESSION_GROUP={session_group}')
+		except (OSError, IndexError):
+			return
+		pipe = Thread(target=self.pipe, args=(upstream, sock), daemon=True)
+		pipe.start()
+		self.pipe(sock, upstream)
+		pipe.join()
+		upstream.close()
+
+	@staticmethod
+	def pipe(source, dest):
+		try:
+			while True:
+				data = source.recv(65536)
+				if not data:
+					break
+				dest.sendall(data)
+		except OSError:
+			pass
+		try:
+			dest.shutdown(1)
+		except OSError:
+			pass
+
+class Server(ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+def listen(port_arg, handler):
+	port = 0 if port_arg == 'auto' else int(port_arg.rsplit(':', 1)[-1])
+	server = Server(('127.0.0.1', port), handler)
+	Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+if __name__ == '__main__':
+	if len(sys.argv) < 3 or sys.argv[1] != '-f':
+		sys.exit('usage: fake_tor.py -f torrc')
+	tor = FakeTor(sys.argv[2])
+	control_server = listen(tor.control_port or 'auto', ControlHandler)
+	socks_listeners = []
+	for index, args in enumerate(tor.socks_ports):
+		server = listen(args[0], SocksHandler)
+		server.session_group = index
+		for flag in args[1:]:
+			if flag.startswith('SessionGroup='):
+				server.session_group = int(flag.split('=', 1)[1])
+		socks_listeners.append(server.server_address[1])
+	if tor.control_port_file:
+		with open(tor.control_port_file, 'w') as port_file:
+			port_file.write(f'PORT=127.0.0.1:{control_server.server_address[1]}\n')
+	if tor.pid_file:
+		with open(tor.pid_file, 'w') as pid_file:
+			pid_file.write(f'{getpid()}\n')
+	if tor.data_dir:
+		for name in ('cached-microdesc-consensus', 'cached-microdescs', 'cached-certs'):
+			if not exists(join(tor.data_dir, name)):
+				with open(join(tor.data_dir, name), 'w') as cache:
+					cache.write('fake\n')
+	signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+	while True:
+		sleep(3600)
+# by azuk4r
@@ -30,7 +30,7 @@ torsel = Torsel(
 
 torsel.run(2, loading_mapped_cookies)
 # Results:
-# [~] Cleaning up previous processes, files, and ports...
+# [~] Cleaning up previous processes and files...
 # [+] Cleanup completed.
 # [~] Creating Tor instance 0...
 # [~] Creating Tor instance 1...
@@ -30,7 +30,7 @@ torsel = Torsel(
 
 torsel.run(1, loading_mapped_cookies)
 # Results:
-# [~] Cleaning up previous processes, files, and ports...
+# [~] Cleaning up previous processes and files...
 # [+] Cleanup completed.
 # [~] Creating Tor instance 0...
 # [+] Tor instance 0 created and running.
@@ -20,7 +20,7 @@ def loading_cookies(driver, wait, By, EC, instance_num):
 
 torsel.run(3, loading_cookies)
 # Results:
-# [~] Cleaning up previous processes, files, and ports...
+# [~] Cleaning up previous processes and files...
 # [+] Cleanup completed.
 # [~] Creating Tor instance 0...
 # [~] Creating Tor instance 1...
@@ -20,7 +20,7 @@ def loading_cookies(driver, wait, By, EC):
 
 torsel.run(1, loading_cookies)
 # Results:
-# [~] Cleaning up previous processes, files, and ports...
+# [~] Cleaning up previous processes and files...
 # [+] Cleanup completed.
 # [~] Creating Tor instance 0...
 # [+] Tor instance 0 created and running.
@@ -0,0 +1,50 @@
+'''Example: Sharing the actions of one job between several worker processes.
+This script demonstrates how to use a Torsel Coordinator with local Worker processes, each one running its own Torsel pool.
+Important:
+- The coordinator reads the work items lazily and hands them out in batches to the workers that ask for them.
+- Each worker has its own Tor instances, browsers and Python interpreter, so the job is not limited to one CPU core.
+- The coordinator generates a random authkey the local workers are given. To accept workers from other hosts,
+  listen on a non-local address and pass the same explicit authkey to the coordinator and to every worker.
+- If a worker dies, the actions it was running are handed out again to the other workers.
+- Results are sent back to the coordinator, so the function must return something picklable.'''
+from multiprocessing import Process
+from torsel import Torsel, Coordinator, Worker
+
+def fetch_ip(http, work_item, log):
+    '''
+    Fetch the current Tor IP through the browserless http session of the instance.
+    Args:
+        http: urllib3 HTTP session routed through the Tor instance, passed automatically by Torsel.
+        work_item: The work item handed out by the coordinator.
+        log: The log function to use for logging messages.'''
+    ip_address = http.request('GET', 'http://icanhazip.com').data.decode().strip()
+    log(f'[+] Work item {work_item}: {ip_address}')
+    return ip_address
+
+def start_worker(worker_num, address, authkey):
+    '''
+    Run a worker with its own Torsel pool until the coordinator has no action left.
+    Args:
+        worker_num: The index of the worker, used to keep the Tor data directories apart.
+        address: The (host, port) the coordinator listens on.
+        authkey: The key the coordinator expects from its workers.'''
+    torsel = Torsel(
+        total_instances=5,            # Tor instances of this worker
+        max_threads=5,                # Concurrent actions of this worker
+        tor_path='/usr/bin/tor',
+        tor_data_dir=f'/tmp/tor_profiles_{worker_num}', # One data directory per worker
+        auto_ports=True               # Let every Tor process pick free ports
+    )
+    Worker(torsel, address, authkey=authkey, batch_size=10).run(fetch_ip)
+
+if __name__ == '__main__':
+    # Listen on a free local port, use ('0.0.0.0', port) and an explicit authkey to accept workers from other hosts
+    with Coordinator(range(100), batch_size=10) as coordinator:
+        workers = [Process(target=start_worker, args=(worker_num, coordinator.address, coordinator.authkey)) for worker_num in range(3)]
+        for worker in workers:
+            worker.start()
+        for action_num, instance_num, result, timings in coordinator.imap():
+            print(f'[+] Action {action_num}, Instance {instance_num}, Current Tor IP: {result}')
+        for worker in workers:
+            worker.join()
+# by azuk4r
@@ -20,6 +20,7 @@ setup(
     install_requires=[
         'selenium',
         'stem',
+        'urllib3[socks]',
     ],
     keywords='tor selenium web scraping automation',
     include_package_data=True,
@@ -0,0 +1,79 @@
+'''Shared fixtures of the offline Torsel tests.
+Torsel runs against the fake tor executable and the fake WebDriver of the benchmarks,
+so the tests need neither tor, a browser nor Internet access.'''
+from http.server import ThreadingHTTPServer
+from os.path import join, abspath, dirname
+from threading import Thread
+import pytest
+import sys
+
+BENCH_DIR = join(dirname(dirname(abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCH_DIR)
+from bench import PageHandler, fake_tor_executable
+from fake_driver import FakeDriver
+import fake_driver
+from torsel import Torsel
+
+@pytest.fixture(autouse=True)
+def fast_fakes(monkeypatch):
+	'''Shortens the latencies of the fake tor and the fake browser.'''
+	monkeypatch.setenv('FAKE_TOR_BOOTSTRAP', '0.2')
+	monkeypatch.setenv('FAKE_TOR_NEWNYM', '0.05')
+	monkeypatch.setattr(fake_driver, 'LAUNCH_LATENCY', 0.01)
+	monkeypatch.setattr(fake_driver, 'GET_LATENCY', 0.01)
+	monkeypatch.setattr(fake_driver, 'QUIT_LATENCY', 0.0)
+
+@pytest.fixture(scope='session')
+def tor_path(tmp_path_factory):
+	'''Path to an executable wrapper running the fake tor.'''
+	return fake_tor_executable(str(tmp_path_factory.mktemp('bin')))
+
+@pytest.fixture(scope='session')
+def page_url():
+	'''URL of a local page, reached by actions through the fake tor SOCKS ports.'''
+	server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+	Thread(target=server.serve_forever, daemon=True).start()
+	yield f'http://127.0.0.1:{server.server_address[1]}/'
+	server.shutdown()
+
+@pytest.fixture
+def make_torsel(tor_path, tmp_path):
+	'''Returns a factory of Torsel objects wired to the fakes, cleaned up after the test.'''
+	created = []
+	def factory(**kwargs):
+		options = dict(
+			total_instances=2,
+			max_threads=2,
+			instances_per_process=2,
+			tor_path=tor_path,
+			tor_data_dir=str(tmp_path / f'tor{len(created)}'),
+			auto_ports=True,
+			driver_factory=FakeDriver)
+		options.update(kwargs)
+		torsel = Torsel(**options)
+		created.append(torsel)
+		return torsel
+	yield factory
+	for torsel in created:
+		torsel.close()
+		torsel.clean_up()
+
+def within(seconds, func, *args, **kwargs):
+	'''Runs a function on a daemon thread and fails the test if it has not returned in time,
+	so a hang is reported instead of blocking the test session.
+	Returns:
+		any: The return value of the function.'''
+	outcome = {}
+	def target():
+		try:
+			outcome['result'] = func(*args, **kwargs)
+		except BaseException as e:
+			outcome['error'] = e
+	thread = Thread(target=target, daemon=True)
+	thread.start()
+	thread.join(seconds)
+	assert not thread.is_alive(), f'{getattr(func, "__name__", func)} did not return within {seconds}s'
+	if 'error' in outcome:
+		raise outcome['error']
+	return outcome.get('result')
+# by azuk4r
@@ -0,0 +1,77 @@
+'''Tests of the event loop counterparts of run.'''
+from threading import current_thread
+from time import sleep, time
+from conftest import within
+import asyncio
+
+def test_arun_waits_for_releases_without_polling(make_torsel):
+	torsel = make_torsel(total_instances=1, instances_per_process=1, max_threads=3)
+	def rotate_tor_ip(instance_num):
+		sleep(0.5)
+		return True
+	torsel.rotate_tor_ip = rotate_tor_ip
+	lease_instance = torsel.lease_instance
+	calls = []
+	def counting_lease_instance(*args, **kwargs):
+		calls.append(args)
+		return lease_instance(*args, **kwargs)
+	torsel.lease_instance = counting_lease_instance
+	done = []
+	within(60, asyncio.run, torsel.arun(3, lambda action_num: done.append(action_num)))
+	assert sorted(done) == [0, 1, 2]
+	# One attempt per action and one per release it waited for, however long the rotations take
+	assert len(calls) <= 6
+
+def test_arun_cleans_up_when_check_stop_func_raises(make_torsel):
+	torsel = make_torsel()
+	def check_stop_func():
+		raise RuntimeError('stop check failed')
+	try:
+		within(60, asyncio.run, torsel.arun(10, lambda: None, check_stop_func))
+	except RuntimeError as e:
+		assert str(e) == 'stop check failed'
+	else:
+		assert False, 'arun did not raise'
+	assert not torsel.tor_processes
+	assert not torsel.owned_tor_processes()
+
+def test_arun_cleans_up_when_cancelled(make_torsel):
+	torsel = make_torsel()
+	async def cancelled_run():
+		try:
+			await asyncio.wait_for(torsel.arun(1000, lambda: sleep(0.2)), 1)
+		except asyncio.TimeoutError:
+			return True
+	assert within(60, asyncio.run, cancelled_run())
+	assert not torsel.tor_processes
+	assert not torsel.owned_tor_processes()
+
+def test_arun_reads_a_slow_source_off_the_executor(make_torsel):
+	torsel = make_torsel(total_instances=4, instances_per_process=4, max_threads=4)
+	produced = {}
+	delays = []
+	def items():
+		for n in range(6):
+			sleep(0.3)
+			produced[n] = time()
+			yield n
+	def action(work_item):
+		delays.append(time() - produced[work_item])
+	within(60, asyncio.run, torsel.arun(items(), action, executor_threads=1))
+	assert len(delays) == 6
+	# No action waits for the executor thread to come back from reading the next items
+	assert max(delays) < 0.25
+
+def test_arun_recycles_instances_on_a_bounded_pool(make_torsel):
+	torsel = make_torsel()
+	recycle_instance = torsel.recycle_instance
+	threads = []
+	def recording_recycle_instance(instance_num):
+		threads.append(current_thread().name)
+		recycle_instance(instance_num)
+	torsel.recycle_instance = recording_recycle_instance
+	within(60, asyncio.run, torsel.arun(10, lambda: None))
+	assert len(threads) == 10
+	assert all(name.startswith('torsel-recycle') for name in threads)
+	assert len(set(threads)) <= 2
+# by azuk4r
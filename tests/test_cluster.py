@@ -0,0 +1,64 @@
+'''Tests of the coordinator/worker mode, with workers running in threads of the test process.'''
+from multiprocessing.connection import Client
+from multiprocessing import AuthenticationError
+from torsel import Coordinator, Worker
+from threading import Thread
+from conftest import within
+from queue import Queue
+from time import sleep
+import pytest
+
+def test_coordinator_hands_out_actions_of_departed_workers(make_torsel, page_url):
+	items = [f'item{n}' for n in range(20)]
+	with Coordinator(items, authkey=b'test', batch_size=3, log=lambda message: None) as coordinator:
+		# A worker that takes a batch and leaves without reporting it
+		deserter = Client(coordinator.address, authkey=b'test')
+		deserter.send(('get', 3))
+		taken = deserter.recv()
+		assert 1 <= len(taken) <= 3
+		def work(http, work_item):
+			sleep(0.01)
+			return work_item
+		workers = [Worker(make_torsel(), coordinator.address, authkey=b'test', batch_size=3) for _ in range(2)]
+		threads = [Thread(target=worker.run, args=(work,), daemon=True) for worker in workers]
+		for thread in threads:
+			thread.start()
+		deserter.close()
+		results = within(120, lambda: {action_num: result for action_num, _, result, _ in coordinator.imap()})
+		for thread in threads:
+			thread.join(30)
+	assert results == dict(enumerate(items))
+	assert sum(worker.reported for worker in workers) == len(items)
+
+def test_coordinator_requires_an_authkey_off_loopback():
+	with pytest.raises(ValueError):
+		Coordinator(range(3), address=('0.0.0.0', 0))
+
+def test_coordinator_generates_an_authkey_by_default():
+	with Coordinator(range(3), log=lambda message: None) as coordinator:
+		assert len(coordinator.authkey) == 32
+		with pytest.raises(AuthenticationError):
+			Client(coordinator.address, authkey=b'guess')
+		conn = Client(coordinator.address, authkey=coordinator.authkey)
+		conn.send(('get', 3))
+		assert conn.recv()[0] == (0, 0)
+		conn.close()
+
+def test_source_fed_by_results_does_not_deadlock(make_torsel):
+	# A crawler frontier: every page reported yields the next one to fetch
+	frontier = Queue()
+	frontier.put(0)
+	def pages():
+		for _ in range(4):
+			yield frontier.get()
+	with Coordinator(pages(), batch_size=2, log=lambda message: None) as coordinator:
+		worker = Worker(make_torsel(), coordinator.address, authkey=coordinator.authkey, batch_size=2, flush_interval=0.1)
+		Thread(target=worker.run, args=(lambda work_item: work_item + 1,), daemon=True).start()
+		def crawl():
+			reported = []
+			for _, _, result, _ in coordinator.imap():
+				reported.append(result)
+				frontier.put(result)
+			return reported
+		assert within(60, crawl) == [1, 2, 3, 4]
+# by azuk4r
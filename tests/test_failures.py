@@ -0,0 +1,19 @@
+'''Tests of runs where Tor instances fail to start or to recover.'''
+from conftest import within
+
+def test_run_returns_when_tor_cannot_be_started(make_torsel):
+	torsel = make_torsel(tor_path='/nonexistent/tor')
+	results = within(30, lambda: list(torsel.imap(2, lambda http: 'unreachable')))
+	assert [result for _, instance_num, result, _ in results if instance_num is not None] == []
+	assert all(isinstance(result, RuntimeError) for _, _, result, _ in results)
+
+def test_failed_recycle_releases_the_lease(make_torsel):
+	torsel = make_torsel(total_instances=1, max_threads=1, instances_per_process=1)
+	def restart(instance_num, fresh_guards=False):
+		raise OSError('cannot write torrc')
+	torsel.rotate_tor_ip = lambda instance_num: False
+	torsel.restart_tor_instance = restart
+	results = within(30, lambda: sorted(torsel.imap(3, lambda http: 'done'), key=lambda item: item[0]))
+	assert results[0][2] == 'done'
+	assert all(isinstance(result, RuntimeError) for _, _, result, _ in results[1:])
+# by azuk4r
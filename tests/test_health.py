@@ -0,0 +1,39 @@
+'''Tests of the instance health records.'''
+from torsel.health import InstanceHealth
+from conftest import within
+
+def test_application_errors_do_not_trigger_a_rebuild():
+	health = InstanceHealth(window=4)
+	for _ in range(4):
+		health.record_failure(0, proxy_error=False)
+	assert health.verdict(0) is None
+	assert not health.proxy_dead(0)
+
+def test_proxy_errors_trigger_a_rebuild():
+	health = InstanceHealth(window=4, max_proxy_errors=2)
+	health.record_failure(0, proxy_error=True)
+	assert health.verdict(0) is None
+	health.record_failure(0, proxy_error=True)
+	assert health.proxy_dead(0)
+	assert 'proxy errors' in health.verdict(0)
+
+def test_slow_instances_are_only_rebuilt_on_request():
+	default, opted_in = InstanceHealth(window=4), InstanceHealth(window=4, slow_factor=3.0)
+	for health in (default, opted_in):
+		for instance_num, seconds in ((0, 1.0), (1, 1.0), (2, 10.0)):
+			for _ in range(3):
+				health.record_success(instance_num, seconds)
+	# Heavy work items make an instance look slow, whatever its circuit
+	assert default.verdict(2) is None
+	assert 'for the pool' in opted_in.verdict(2)
+
+def test_user_function_errors_do_not_quarantine_instances(make_torsel):
+	torsel = make_torsel(health_window=4)
+	def action(http):
+		raise ValueError('element not found')
+	results = within(60, lambda: list(torsel.imap(3, action)))
+	assert all(isinstance(result, ValueError) for _, _, result, _ in results)
+	counters = torsel.metrics.snapshot()['counters']
+	assert 'quarantines' not in counters
+	assert 'restarts' not in counters
+# by azuk4r
@@ -0,0 +1,66 @@
+'''Tests of the resource-blocking load profile.'''
+from fake_driver import FakeDriver, url_pattern_match, legacy_match
+from torsel.torsel import resource_patterns
+from conftest import within
+import pytest
+
+def blocked(url, patterns):
+	'''Matches a URL against the urlPatterns of Network.setBlockedURLs, as the fake browser does.'''
+	return any(url_pattern_match(pattern, url) for pattern in patterns)
+
+@pytest.mark.parametrize('resource, url', [
+	('media', 'https://www.webmd.com/'),
+	('image', 'https://www.iconfinder.com/search'),
+	('stylesheet', 'https://css-tricks.com/'),
+	('image', 'https://www.svgrepo.com/collections'),
+	('image', 'https://www.gifs.com/'),
+	('image', 'https://cdn.example.com/logo.png.html')])
+def test_patterns_leave_hostnames_and_pages_alone(resource, url):
+	assert not blocked(url, resource_patterns(resource))
+
+def test_legacy_patterns_match_anywhere_in_the_url():
+	# Why resource types are not blocked through the legacy urls patterns
+	assert legacy_match('*.webm', 'https://www.webmd.com/')
+	assert legacy_match('*.png', 'https://cdn.example.com/logo.png.html')
+
+@pytest.mark.parametrize('resource, url', [
+	('media', 'https://cdn.example.com/clip.webm'),
+	('image', 'https://cdn.example.com/logo.png?v=3'),
+	('font', 'https://fonts.example.com:8443/inter.woff2'),
+	('stylesheet', 'https://example.com/site.css?ver=1')])
+def test_patterns_block_resources(resource, url):
+	assert blocked(url, resource_patterns(resource))
+
+def test_browsers_skip_blocked_resources(make_torsel, page_url):
+	torsel = make_torsel(block_resources=['image', 'media'], blocked_urls=['*tracker*'])
+	def action(driver):
+		for url in (page_url, page_url + 'logo.png', page_url + 'clip.webm', 'http://tracker.example/pixel'):
+			driver.get(url)
+		return driver.pages
+	results = within(60, lambda: [result for _, _, result, _ in torsel.imap(2, action)])
+	assert results == [1, 1]
+	counters = torsel.metrics.snapshot()['counters']
+	assert counters['blocked_requests']['total'] == 6
+	assert counters['requests']['total'] == 2
+
+def test_browsers_load_pages_on_lookalike_hosts(make_torsel):
+	torsel = make_torsel(block_resources=['image', 'media'])
+	def action(driver):
+		driver.get('https://www.webmd.com/')
+		driver.get('https://www.gifs.com/')
+		return driver.pages
+	assert within(60, lambda: [result for _, _, result, _ in torsel.imap(1, action)]) == [2]
+
+def test_browsers_without_url_patterns_keep_blocked_urls(make_torsel, page_url):
+	class LegacyDriver(FakeDriver):
+		supports_url_patterns = False
+	messages = []
+	torsel = make_torsel(block_resources=['media'], blocked_urls=['*tracker*'], driver_factory=LegacyDriver)
+	torsel.log = messages.append
+	def action(driver):
+		for url in (page_url + 'clip.webm', 'http://tracker.example/pixel'):
+			driver.get(url)
+		return driver.pages
+	assert within(60, lambda: [result for _, _, result, _ in torsel.imap(1, action)]) == [1]
+	assert any('cannot block resource types' in message for message in messages)
+# by azuk4r
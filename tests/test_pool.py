@@ -0,0 +1,28 @@
+'''Tests of running actions on the Torsel pool, one-off or kept alive across runs.'''
+from conftest import within
+
+def test_run_serves_every_action(make_torsel, page_url):
+	torsel = make_torsel()
+	results = within(60, lambda: sorted(
+		(action_num, result) for action_num, _, result, _ in torsel.imap(6, lambda http: http.request('GET', page_url).status)))
+	assert results == [(n, 200) for n in range(6)]
+	assert not torsel.tor_processes
+
+def test_browser_actions_get_a_driver(make_torsel, page_url):
+	torsel = make_torsel(reuse_drivers=True)
+	results = within(60, lambda: [result for _, _, result, _ in torsel.imap(4, lambda driver: driver.get(page_url) or driver.current_url)])
+	assert results == [page_url] * 4
+
+def test_pool_is_reused_across_runs(make_torsel, page_url):
+	action = lambda http: http.request('GET', page_url).status
+	with make_torsel() as pool:
+		processes = dict(pool.tor_processes)
+		for _ in range(3):
+			results = within(60, lambda: [result for _, _, result, _ in pool.imap(3, action)])
+			assert results == [200] * 3
+			assert pool.tor_processes == processes
+		assert pool.metrics.snapshot()['counters']['actions']['total'] == 9
+		assert len(pool.metrics.snapshot()['phases']['bootstrap']['instances']) == 1
+	assert not pool.tor_processes
+	assert not pool.tor_controllers
+# by azuk4r
@@ -0,0 +1,48 @@
+'''Tests of restarting Tor processes shared by several instances.'''
+from threading import Lock
+from conftest import within
+from time import sleep
+
+def failing_rotations(torsel, failures):
+	'''Makes the next rotations of the given instances fail, so their Tor process is restarted.'''
+	rotate = torsel.rotate_tor_ip
+	lock = Lock()
+	def rotate_tor_ip(instance_num):
+		with lock:
+			if failures.get(instance_num):
+				failures[instance_num] -= 1
+				return False
+		return rotate(instance_num)
+	torsel.rotate_tor_ip = rotate_tor_ip
+
+def test_restart_waits_for_leased_siblings(make_torsel, page_url):
+	torsel = make_torsel()
+	failing_rotations(torsel, {0: 1, 1: 0})
+	def action(http, instance_num, action_num):
+		if action_num == 1:
+			# Still running on the shared process while the rotation of the sibling fails
+			sleep(1)
+		return http.request('GET', page_url, retries=False).status
+	results = within(60, lambda: {action_num: (result, timings['attempts']) for action_num, _, result, timings in torsel.imap(2, action)})
+	# The sibling was not cut off by the restart, so it did not need a retry
+	assert results == {0: (200, 1), 1: (200, 1)}
+	assert torsel.metrics.snapshot()['counters']['restarts']['total'] == 1
+
+def test_concurrent_restarts_of_a_process_are_coalesced(make_torsel):
+	torsel = make_torsel()
+	failing_rotations(torsel, {0: 1, 1: 1})
+	results = within(60, lambda: [result for _, _, result, _ in torsel.imap(4, lambda: 'done')])
+	assert results == ['done'] * 4
+	# One bootstrap at warm-up and one for the restart, however many rotations failed
+	assert torsel.metrics.snapshot()['phases']['bootstrap']['total']['count'] == 2
+
+def test_restart_drops_drivers_and_sessions_on_old_ports(make_torsel, page_url):
+	torsel = make_torsel(reuse_drivers=True)
+	failing_rotations(torsel, {0: 1, 1: 1})
+	def action(driver, http, instance_num):
+		proxy = f'--proxy-server=socks5://127.0.0.1:{torsel.socks_port(instance_num)}'
+		return proxy in driver.arguments, http.request('GET', page_url, retries=False).status
+	results = within(60, lambda: [(result, timings['attempts']) for _, _, result, timings in torsel.imap(4, action)])
+	# The restarted tor listens on new SOCKS ports, actions after it must not use the previous ones
+	assert results == [((True, 200), 1)] * 4
+# by azuk4r
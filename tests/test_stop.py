@@ -0,0 +1,36 @@
+'''Tests of stopping runs early while the workers wait on a slow, lazy source.'''
+from conftest import within
+from time import sleep
+
+def slow_items(count, delay):
+	for n in range(count):
+		sleep(delay)
+		yield n
+
+def test_run_stops_on_check_stop_func_with_slow_source(make_torsel, page_url):
+	torsel = make_torsel(max_threads=4, total_instances=4, instances_per_process=4)
+	done = []
+	def action(http, work_item):
+		done.append(work_item)
+	within(60, torsel.run, slow_items(1000, 0.3), action, check_stop_func=lambda: len(done) >= 2)
+	assert 2 <= len(done) < 10
+
+def test_breaking_out_of_imap_with_slow_source(make_torsel):
+	torsel = make_torsel(max_threads=4, total_instances=4, instances_per_process=4)
+	def consume():
+		results = torsel.imap(slow_items(1000, 0.3), lambda http, work_item: work_item)
+		first = next(results)
+		results.close()
+		return first
+	assert within(60, consume)[2] == 0
+	assert not torsel.tor_processes
+
+def test_arun_stops_with_slow_source(make_torsel):
+	import asyncio
+	torsel = make_torsel(max_threads=4, total_instances=4, instances_per_process=4)
+	done = []
+	async def action(work_item):
+		done.append(work_item)
+	within(60, asyncio.run, torsel.arun(slow_items(1000, 0.3), action, check_stop_func=lambda: len(done) >= 2))
+	assert len(done) >= 2
+# by azuk4r
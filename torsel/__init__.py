@@ -1,6 +1,7 @@
 '''Torsel - A Python module for managing Tor instances with Selenium.'''
 from .torsel import Torsel
 from .cookies_manager import CookiesManager
-__all__ = ['Torsel', 'CookiesManager']
+from .cluster import Coordinator, Worker
+__all__ = ['Torsel', 'CookiesManager', 'Coordinator', 'Worker']
 __version__ = '0.4.31'
 # by azuk4r
\ No newline at end of file
@@ -0,0 +1,97 @@
+from threading import Thread, Event
+from queue import Queue, Empty, Full
+
+class ActionSource:
+	'''ActionSource:
+	Feeds actions to the Torsel workers from a number of actions or from any iterable of work items.
+	Items are pulled lazily by a feeder thread into a bounded queue, so memory stays constant
+	however long the source is and the first actions start without waiting for the rest.'''
+	END = object()
+
+	def __init__(self, actions, buffer_size, log=print, numbered=False):
+		'''Initializes the ActionSource object and starts consuming the source.
+		Args:
+			actions (int or iterable): A number of actions, or an iterable (list, generator, cursor...) of work items.
+			buffer_size (int): Maximum number of work items pulled ahead of the workers.
+			log (callable): The function used to report errors raised by the source.
+			numbered (bool): If True, the iterable yields (action_num, work_item) pairs numbered elsewhere, e.g. by a Coordinator.'''
+		if isinstance(actions, int):
+			self.size = actions
+			items = range(actions)
+		else:
+			self.size = len(actions) if hasattr(actions, '__len__') else None
+			items = actions
+		self.log = log
+		self.numbered = numbered
+		self.stopped = Event()
+		self.finished = Event()
+		self.queue = Queue(maxsize=max(1, buffer_size))
+		self.feeder = Thread(target=self.feed, args=(items,), daemon=True)
+		self.feeder.start()
+
+	def feed(self, items):
+		'''Pulls work items from the source into the queue until it is exhausted or the source is stopped.
+		Args:
+			items (iterable): The work items.'''
+		try:
+			for action_num, work_item in (items if self.numbered else enumerate(items)):
+				if self.stopped.is_set():
+					return
+				self.queue.put((action_num, work_item))
+		except Exception as e:
+			self.log(f'[-] Failed to read the next work item: {e}')
+		self.queue.put(self.END)
+
+	def next(self, block=True):
+		'''Returns the next action, blocking until the feeder provides it.
+		Args:
+			block (bool): If False, return None right away when the feeder has no action ready.
+		Returns:
+			tuple: (action_num, work_item), or None once the source is exhausted or stopped, which sets finished.'''
+		if self.stopped.is_set():
+			self.finished.set()
+			return None
+		try:
+			item = self.queue.get(block)
+		except Empty:
+			return None
+		if item is self.END or self.stopped.is_set():
+			# Leave the marker for the other workers
+			self.end()
+			self.finished.set()
+			return None
+		return item
+
+	def end(self):
+		'''Puts the END marker in the queue, discarding pending work items if it is full.'''
+		while True:
+			try:
+				self.queue.put_nowait(self.END)
+				return
+			except Full:
+				self.discard()
+
+	def stop(self):
+		'''Stops handing out actions, discarding the work items already pulled.
+		Workers waiting for an action are woken up right away, even if the feeder is still
+		blocked reading a slow source.'''
+		self.stopped.set()
+		self.discard()
+		self.end()
+
+	def discard(self):
+		'''Empties the queue.'''
+		while True:
+			try:
+				self.queue.get_nowait()
+			except Empty:
+				break
+
+	def workers(self, max_threads):
+		'''Returns how many workers are worth starting for this source.
+		Args:
+			max_threads (int): The maximum number of concurrent workers.
+		Returns:
+			int: max_threads, or fewer if the source is known to hold fewer actions.'''
+		return max_threads if self.size is None else min(self.size, max_threads)
+# by azuk4r
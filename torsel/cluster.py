@@ -0,0 +1,266 @@
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+from threading import Thread, Condition, Lock
+from .action_source import ActionSource
+from ipaddress import ip_address
+from socket import gethostbyname
+from collections import deque
+from time import time, sleep
+from pickle import dumps
+from queue import Queue
+from os import urandom
+
+class Coordinator:
+	'''Coordinator:
+	Shares the actions of a single source between Worker processes, local or on other hosts,
+	each running its own Torsel pool, and collects their results.
+	Workers connect over TCP and pull actions in batches. The actions of a worker that disconnects
+	before reporting them are handed out again to the others.'''
+	def __init__(self, actions, address=('127.0.0.1', 0), authkey=None, batch_size=10, log=print):
+		'''Initializes the Coordinator object and starts accepting workers.
+		Args:
+			actions (int or iterable): A number of actions, or an iterable of work items consumed lazily.
+			address (tuple): The (host, port) to listen on, port 0 picks a free one.
+			authkey (bytes, optional): The key workers must present to connect. By default a random key is
+				generated, available as the authkey attribute, and only a loopback address may be listened on.
+			batch_size (int): Maximum number of actions handed out per request.
+			log (callable): The function used to report workers joining and leaving.
+		Raises:
+			ValueError: If no authkey is given for an address other hosts can reach.'''
+		if not authkey:
+			# Workers and the coordinator unpickle what they receive, never talk to unauthenticated peers
+			if not ip_address(gethostbyname(address[0])).is_loopback:
+				raise ValueError(f'An authkey is required to accept workers on {address[0]}')
+			authkey = urandom(32)
+		self.authkey = authkey
+		self.batch_size = max(1, batch_size)
+		self.log = log
+		self.source = ActionSource(actions, 2 * self.batch_size, log)
+		self.listener = Listener(address, authkey=authkey)
+		self.address = self.listener.address
+		self.state = Condition()
+		self.retry = deque()
+		self.outstanding = 0
+		self.exhausted = False
+		self.finished = False
+		self.closed = False
+		self.results = Queue()
+		Thread(target=self.accept, daemon=True).start()
+
+	def __enter__(self):
+		'''Returns the coordinator, closed at the end of the with block.'''
+		return self
+
+	def __exit__(self, *exc_info):
+		'''Closes the coordinator at the end of the with block.'''
+		self.close()
+
+	def accept(self):
+		'''Accepts worker connections until the coordinator is closed, serving each one on its own thread.'''
+		while True:
+			try:
+				conn = self.listener.accept()
+			except AuthenticationError as e:
+				self.log(f'[-] Rejected a worker: {e}')
+				continue
+			except OSError:
+				return
+			if self.closed:
+				conn.close()
+				return
+			Thread(target=self.serve, args=(conn, self.listener.last_accepted), daemon=True).start()
+
+	def serve(self, conn, peer):
+		'''Answers the requests of a worker: ('get', count) for actions, ('results', items) to report them.
+		Args:
+			conn (Connection): The connection to the worker.
+			peer (tuple): The address of the worker.'''
+		self.log(f'[+] Worker {peer} connected.')
+		assigned = {}
+		try:
+			while True:
+				request, payload = conn.recv()
+				if request == 'get':
+					batch = self.take(payload)
+					assigned.update(batch or ())
+					conn.send(batch)
+				elif request == 'results':
+					for item in payload:
+						assigned.pop(item[0], None)
+						self.results.put(item)
+					self.complete(len(payload))
+		except (EOFError, OSError):
+			pass
+		finally:
+			conn.close()
+			if assigned:
+				self.log(f'[-] Worker {peer} left with {len(assigned)} actions in progress, handing them out again.')
+			else:
+				self.log(f'[~] Worker {peer} disconnected.')
+			with self.state:
+				self.retry.extend(assigned.items())
+				self.outstanding -= len(assigned)
+				self.state.notify_all()
+
+	def take(self, count):
+		'''Takes the next actions for a worker, those given back by departed workers first.
+		Args:
+			count (int): The number of actions the worker asks for.
+		Returns:
+			list: Up to count (action_num, work_item) pairs, empty once every action is done, or None if no
+				action is ready yet, the source being slow or actions in progress elsewhere being due back.'''
+		batch = []
+		count = min(max(1, count), self.batch_size)
+		with self.state:
+			if self.closed:
+				return batch
+			while len(batch) < count:
+				if self.retry:
+					batch.append(self.retry.popleft())
+				elif self.exhausted:
+					break
+				else:
+					# Only the actions already read, waiting for a slow source would keep the worker from reporting
+					action = self.source.next(block=False)
+					if action is not None:
+						batch.append(action)
+						continue
+					self.exhausted = self.source.finished.is_set()
+					break
+			self.outstanding += len(batch)
+			self.check_finished()
+			if not batch and not self.finished:
+				return None
+		return batch
+
+	def complete(self, count):
+		'''Records that a worker reported some actions.
+		Args:
+			count (int): The number of actions reported.'''
+		with self.state:
+			self.outstanding -= count
+			self.check_finished()
+
+	def check_finished(self):
+		'''Ends the results stream once every action was handed out and reported. Must be called while holding state.'''
+		if self.exhausted and not self.retry and self.outstanding == 0 and not self.finished:
+			self.finished = True
+			self.results.put(None)
+			self.state.notify_all()
+
+	def imap(self):
+		'''Yields the outcome of each action as workers report it.
+		Leaving the loop early stops handing out actions, the workers finish the ones they are running.
+		Yields:
+			tuple: (action_num, instance_num, result, timings) as yielded by Torsel.imap on the worker,
+				instance_num being the index of the Tor instance within that worker's pool.'''
+		try:
+			while True:
+				item = self.results.get()
+				if item is None:
+					return
+				yield item
+		finally:
+			self.close()
+
+	def close(self):
+		'''Stops accepting workers and handing out actions. Connected workers are told there is nothing left
+		on their next request, so they report the actions they are running and disconnect.'''
+		with self.state:
+			if self.closed:
+				return
+			self.closed = True
+			self.finished = True
+		self.source.stop()
+		self.listener.close()
+
+class Worker:
+	'''Worker:
+	Runs the actions handed out by a Coordinator on a Torsel pool and reports their results.'''
+	def __init__(self, torsel, address, authkey=None, batch_size=10, flush_interval=1.0):
+		'''Initializes the Worker object.
+		Args:
+			torsel (Torsel): The Torsel object running the actions of this worker.
+			address (tuple): The (host, port) of the coordinator.
+			authkey (bytes): The key expected by the coordinator, its authkey attribute if it generated one.
+			batch_size (int): Number of actions asked for at once, and of results reported at once.
+			flush_interval (float): Maximum seconds a result waits before being reported, and between requests while no action is ready.'''
+		self.torsel = torsel
+		self.address = tuple(address)
+		self.authkey = authkey
+		self.batch_size = max(1, batch_size)
+		self.flush_interval = flush_interval
+		self.lock = Lock()
+		self.pending = []
+		self.last_flush = time()
+		self.reported = 0
+
+	def flush(self, conn):
+		'''Reports the pending results to the coordinator. Must be called while holding lock.
+		Args:
+			conn (Connection): The connection to the coordinator.'''
+		if self.pending:
+			conn.send(('results', self.pending))
+			self.reported += len(self.pending)
+			self.pending = []
+		self.last_flush = time()
+
+	def pull(self, conn):
+		'''Yields the actions handed out by the coordinator, a batch at a time, until it has none left.
+		Pending results are reported with each request, so the coordinator learns about them while this worker waits.
+		Args:
+			conn (Connection): The connection to the coordinator.
+		Yields:
+			tuple: (action_num, work_item) numbered by the coordinator.'''
+		while not conn.closed:
+			with self.lock:
+				self.flush(conn)
+				conn.send(('get', self.batch_size))
+			# Only this thread receives, results keep being reported while the coordinator answers
+			batch = conn.recv()
+			if batch is None:
+				# The source is slow or other workers hold actions that may come back, ask again later
+				sleep(self.flush_interval)
+				continue
+			if not batch:
+				return
+			yield from batch
+
+	def portable(self, item):
+		'''Makes sure a result can be sent to the coordinator.
+		Args:
+			item (tuple): (action_num, instance_num, result, timings) as yielded by Torsel.imap.
+		Returns:
+			tuple: The same item, with a result that cannot be pickled replaced by a RuntimeError describing it.'''
+		action_num, instance_num, result, timings = item
+		try:
+			dumps(result)
+		except Exception as e:
+			result = RuntimeError(f'Result of action {action_num} cannot be sent to the coordinator: {e}')
+		return action_num, instance_num, result, timings
+
+	def run(self, user_function, check_stop_func=None):
+		'''Connects to the coordinator and runs its actions until none is left.
+		Args:
+			user_function (callable): The function to execute for each action, as with Torsel.run.
+			check_stop_func (callable, optional): A function to check if this worker should stop.
+		Returns:
+			int: The number of actions this worker reported.'''
+		conn = Client(self.address, authkey=self.authkey)
+		source = ActionSource(self.pull(conn), 2 * self.torsel.max_threads, self.torsel.log, numbered=True)
+		self.pending = []
+		self.reported = 0
+		try:
+			for item in self.torsel.imap(source, user_function, check_stop_func):
+				with self.lock:
+					self.pending.append(self.portable(item))
+					if len(self.pending) >= self.batch_size or time() - self.last_flush >= self.flush_interval:
+						self.flush(conn)
+			with self.lock:
+				self.flush(conn)
+		except (EOFError, OSError) as e:
+			self.torsel.log(f'[-] Lost the coordinator at {self.address}: {e}')
+		finally:
+			conn.close()
+		return self.reported
+# by azuk4r
@@ -1,17 +1,26 @@
+from selenium.webdriver.support.ui import WebDriverWait
 from os.path import exists, isabs, join
-from time import sleep
+from collections import OrderedDict
+from threading import Lock
 from json import load
+from os import stat
 
 class CookiesManager:
 	'''CookiesManager: 
 	A class to handle loading cookies into a Selenium WebDriver instance.'''
-	def __init__(self, base_dir=None, verbose=False):
+	def __init__(self, base_dir=None, verbose=False, cache_size=32, load_timeout=30):
 		'''Initializes the CookiesManager object with the specified parameters.
 		Args:
 			base_dir (str): The base directory where cookie files are stored. If None, expects absolute paths.
-			verbose (bool): If True, print logs to the console.'''
+			verbose (bool): If True, print logs to the console.
+			cache_size (int): Maximum number of parsed cookie files kept in memory.
+			load_timeout (int): Maximum time in seconds to wait for a page to finish loading.'''
 		self.base_dir = base_dir
 		self.verbose = verbose
+		self.load_timeout = load_timeout
+		self.cache_size = cache_size
+		self.cache = OrderedDict()
+		self.cache_lock = Lock()
 		if self.base_dir and not isabs(self.base_dir):
 			raise ValueError('base_dir must be an absolute path.')
 		
@@ -22,6 +31,102 @@ class CookiesManager:
 		if self.verbose:
 			print(message)
 
+	def read_cookies(self, file_path):
+		'''Returns the parsed cookies of a JSON file, with invalid sameSite values removed.
+		Parsed files are cached (least recently used first out) and parsed again when their
+		modification time or size changes. The returned list is shared and must not be modified.
+		Args:
+			file_path (str): The absolute path to the JSON file containing the cookies.
+		Returns:
+			list: The cookies, or None if the file does not exist.'''
+		try:
+			file_stat = stat(file_path)
+		except OSError:
+			return None
+		version = (file_stat.st_mtime_ns, file_stat.st_size)
+		with self.cache_lock:
+			cached = self.cache.get(file_path)
+			if cached and cached[0] == version:
+				self.cache.move_to_end(file_path)
+				return cached[1]
+		with open(file_path, 'r') as file:
+			cookies = load(file)
+		for cookie in cookies:
+			if 'sameSite' in cookie:
+				if cookie['sameSite'] not in ['Strict', 'Lax', 'None']:
+					del cookie['sameSite']
+		with self.cache_lock:
+			self.cache[file_path] = (version, cookies)
+			self.cache.move_to_end(file_path)
+			while len(self.cache) > self.cache_size:
+				self.cache.popitem(last=False)
+		return cookies
+
+	def resolve_path(self, cookie_file):
+		'''Returns the absolute path of a cookie file.
+		Args:
+			cookie_file (str): The path to the JSON file containing the cookies, absolute or relative to base_dir.
+		Returns:
+			str: The absolute path to the cookie file.'''
+		file_path = cookie_file if isabs(cookie_file) else join(self.base_dir, cookie_file)
+		if not isabs(file_path):
+			raise ValueError('cookie_file path must be absolute.')
+		return file_path
+
+	def wait_for_page_load(self, driver):
+		'''Waits until the current document has finished loading.
+		Args:
+			driver (WebDriver): The Selenium WebDriver instance.'''
+		WebDriverWait(driver, self.load_timeout).until(
+			lambda d: d.execute_script('return document.readyState') == 'complete')
+
+	def cdp_cookie(self, cookie, url):
+		'''Converts a cookie from a JSON cookie file into a DevTools Network.CookieParam.
+		Cookies without a domain are scoped to the URL they are loaded for.
+		Args:
+			cookie (dict): The cookie, in WebDriver or browser extension export format.
+			url (str): The URL the cookies are loaded for.
+		Returns:
+			dict: The cookie parameter for Network.setCookies.'''
+		param = {'name': cookie['name'], 'value': cookie['value']}
+		for key in ('domain', 'path', 'secure', 'httpOnly', 'sameSite'):
+			if key in cookie:
+				param[key] = cookie[key]
+		expires = cookie.get('expiry', cookie.get('expirationDate'))
+		if expires is not None:
+			param['expires'] = expires
+		if 'domain' not in param:
+			param['url'] = url
+		return param
+
+	def inject_cookies(self, driver, cookie_file, url):
+		'''Sets every cookie of a JSON file in one DevTools call, then opens the URL with the cookies in place.
+		Unlike load_cookies, the page is loaded only once and nothing waits longer than the page load itself.
+		Args:
+			driver (WebDriver): The Chrome WebDriver instance where cookies will be loaded.
+			cookie_file (str): The path to the JSON file containing the cookies.
+			url (str): The URL to open once the cookies are set.
+		Returns:
+			bool: True if the cookies were injected, False otherwise.'''
+		file_path = self.resolve_path(cookie_file)
+		try:
+			cookies = self.read_cookies(file_path)
+		except Exception as e:
+			self.log(f'[-] Failed to read cookie file {file_path}: {e}')
+			return False
+		if cookies is None:
+			self.log(f'[-] Cookie file {file_path} not found.')
+			return False
+		try:
+			driver.execute_cdp_cmd('Network.setCookies', {'cookies': [self.cdp_cookie(cookie, url) for cookie in cookies]})
+		except Exception as e:
+			self.log(f'[-] Failed to inject cookies from {file_path}: {e}')
+			return False
+		self.log(f'[+] Cookies injected from {file_path}')
+		driver.get(url)
+		self.wait_for_page_load(driver)
+		return True
+
 	def load_cookies(self, driver, cookie_file, initial_url):
 		'''Loads cookies from a specified JSON file into the Selenium WebDriver.
 		Args:
@@ -30,27 +135,20 @@ class CookiesManager:
 			initial_url (str): The initial URL to ensure the correct domain for cookie loading.
 		Raises:
 			Exception: If there is an error adding any of the cookies to the WebDriver.'''
-		file_path = cookie_file if isabs(cookie_file) else join(self.base_dir, cookie_file)
-		if not isabs(file_path):
-			raise ValueError('cookie_file path must be absolute.')
+		file_path = self.resolve_path(cookie_file)
 		driver.get(initial_url)
 		self.log('[~] Trying to load cookies...')
-		sleep(5)
+		self.wait_for_page_load(driver)
 		if exists(file_path):
 			try:
-				with open(file_path, 'r') as file:
-					cookies = load(file)
-					for cookie in cookies:
-						if 'sameSite' in cookie:
-							if cookie['sameSite'] not in ['Strict', 'Lax', 'None']:
-								del cookie['sameSite']
-						try:
-							driver.add_cookie(cookie)
-						except Exception as e:
-							pass
+				for cookie in self.read_cookies(file_path):
+					try:
+						driver.add_cookie(cookie)
+					except Exception as e:
+						pass
 				self.log(f'[+] Cookies loaded from {file_path}')
 				driver.refresh()  # Refresh to apply cookies
-				sleep(5)
+				self.wait_for_page_load(driver)
 			except Exception:
 				pass
 		else:
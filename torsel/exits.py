@@ -0,0 +1,121 @@
+from collections import deque, Counter
+from threading import Lock
+from time import time
+
+class ExitRegistry:
+	'''ExitRegistry:
+	Keeps track of the exit relay of every Tor circuit, learned from the controller's CIRC and STREAM events,
+	the exit currently used by each instance, and which exits recent actions went out through.'''
+	def __init__(self, history_size=1000):
+		'''Initializes the ExitRegistry object.
+		Args:
+			history_size (int): Number of recent actions whose exit is kept in history.'''
+		self.lock = Lock()
+		self.circuits = {}
+		self.instance_exits = {}
+		self.addresses = {}
+		self.last_used = {}
+		self.usage = Counter()
+		self.history = deque(maxlen=history_size)
+
+	def circuit_built(self, process_num, circ_id, path):
+		'''Records the exit of a circuit that finished building.
+		Args:
+			process_num (int): The index of the Tor process owning the circuit.
+			circ_id (str): The circuit id.
+			path (list): The (fingerprint, nickname) relays of the circuit, exit last.'''
+		if path:
+			with self.lock:
+				self.circuits[(process_num, circ_id)] = path[-1]
+
+	def circuit_closed(self, process_num, circ_id):
+		'''Forgets a circuit that was closed or failed.
+		Args:
+			process_num (int): The index of the Tor process owning the circuit.
+			circ_id (str): The circuit id.'''
+		with self.lock:
+			self.circuits.pop((process_num, circ_id), None)
+
+	def assign(self, instance_num, process_num, circ_id):
+		'''Makes the exit of a circuit the current exit of an instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			process_num (int): The index of the Tor process owning the circuit.
+			circ_id (str): The circuit id.
+		Returns:
+			tuple: The (fingerprint, nickname) of the exit, or None if the circuit is unknown.'''
+		with self.lock:
+			exit_relay = self.circuits.get((process_num, circ_id))
+			if exit_relay:
+				self.instance_exits[instance_num] = exit_relay
+			return exit_relay
+
+	def forget_process(self, process_num=None, instances=()):
+		'''Forgets the circuits of a Tor process that was stopped, and the current exit of its instances.
+		Args:
+			process_num (int, optional): The index of the Tor process, if None every circuit and exit is forgotten.
+			instances (list): The indexes of the Tor instances served by the process.'''
+		with self.lock:
+			if process_num is None:
+				self.circuits.clear()
+				self.instance_exits.clear()
+				return
+			for key in [key for key in self.circuits if key[0] == process_num]:
+				del self.circuits[key]
+			for instance_num in instances:
+				self.instance_exits.pop(instance_num, None)
+
+	def clear_exit(self, instance_num):
+		'''Forgets the current exit of an instance whose circuits were closed.
+		Args:
+			instance_num (int): The index of the Tor instance.'''
+		with self.lock:
+			self.instance_exits.pop(instance_num, None)
+
+	def current(self, instance_num):
+		'''Returns the exit currently used by an instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			tuple: The (fingerprint, nickname) of the exit, or None if it is not known yet.'''
+		with self.lock:
+			return self.instance_exits.get(instance_num)
+
+	def recently_used(self, fingerprint, window):
+		'''Checks whether an action went out through an exit within the last seconds.
+		Args:
+			fingerprint (str): The fingerprint of the exit relay.
+			window (float): The number of seconds to look back.
+		Returns:
+			bool: True if the exit was used within the window, False otherwise.'''
+		with self.lock:
+			last_used = self.last_used.get(fingerprint)
+		return last_used is not None and time() - last_used < window
+
+	def record_action(self, action_num, instance_num, address=None):
+		'''Records that an action went out through the current exit of its instance.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.
+			address (str, optional): The IP address of the exit relay.
+		Returns:
+			dict: The exit of the action with 'fingerprint', 'nickname' and 'address' keys, or None if unknown.'''
+		with self.lock:
+			exit_relay = self.instance_exits.get(instance_num)
+			if exit_relay is None:
+				return None
+			fingerprint, nickname = exit_relay
+			self.last_used[fingerprint] = time()
+			self.usage[fingerprint] += 1
+			record = {'action_num': action_num, 'instance_num': instance_num, 'fingerprint': fingerprint,
+				'nickname': nickname, 'address': address, 'time': time()}
+			self.history.append(record)
+			return record
+
+	def distinct_exits(self):
+		'''Returns how many distinct exits actions went out through, and how many were used only once.
+		Returns:
+			tuple: (distinct exits, exits used by a single action).'''
+		with self.lock:
+			return len(self.usage), sum(1 for count in self.usage.values() if count == 1)
+# by azuk4r
@@ -0,0 +1,182 @@
+from urllib3.exceptions import ProxyError, NewConnectionError, ConnectTimeoutError, ReadTimeoutError, ProtocolError
+from selenium.common.exceptions import WebDriverException
+from statistics import mean, median
+from collections import deque
+from threading import Lock
+
+# Chrome network errors raised when the Tor SOCKS proxy or the circuit behind it fails
+PROXY_ERROR_CODES = (
+	'ERR_PROXY_CONNECTION_FAILED',
+	'ERR_SOCKS_CONNECTION_FAILED',
+	'ERR_SOCKS_CONNECTION_HOST_UNREACHABLE',
+	'ERR_TUNNEL_CONNECTION_FAILED',
+	'ERR_CONNECTION_CLOSED',
+	'ERR_CONNECTION_RESET',
+	'ERR_EMPTY_RESPONSE',
+	'ERR_TIMED_OUT')
+
+def is_proxy_error(error):
+	'''Tells errors of the Tor proxy or circuit apart from errors of the user function itself.
+	Args:
+		error (Exception): The exception raised by an action.
+	Returns:
+		bool: True if the error comes from the proxy or the circuit, False otherwise.'''
+	if isinstance(error, (ProxyError, NewConnectionError, ConnectTimeoutError, ReadTimeoutError, ProtocolError, ConnectionError)):
+		return True
+	if isinstance(error, WebDriverException):
+		message = error.msg or ''
+		return any(code in message for code in PROXY_ERROR_CODES)
+	return False
+
+class InstanceHealth:
+	'''InstanceHealth:
+	Rolling health records of the Tor instances: recent outcomes, action latencies, circuit build times
+	and consecutive proxy and application errors, used to rank instances and to detect the ones to rebuild.'''
+	def __init__(self, window=20, max_proxy_errors=2, min_success_rate=0.5, slow_factor=None):
+		'''Initializes the InstanceHealth object.
+		Args:
+			window (int): Number of recent actions and rotations each record keeps.
+			max_proxy_errors (int): Consecutive proxy errors after which an instance is considered dead.
+			min_success_rate (float): Rate of attempts without proxy errors below which an instance is rebuilt, once half the window is filled.
+			slow_factor (float): An instance is rebuilt when its latency exceeds the median of the others by this factor, None disables it.'''
+		self.window = max(1, window)
+		self.max_proxy_errors = max_proxy_errors
+		self.min_success_rate = min_success_rate
+		self.slow_factor = slow_factor
+		self.lock = Lock()
+		self.records = {}
+
+	def record(self, instance_num):
+		'''Returns the health record of an instance, creating it if needed. Must be called while holding lock.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			dict: The record, holding the 'outcomes', 'latencies', 'circuits', 'proxy_errors' and 'app_errors' keys.'''
+		record = self.records.get(instance_num)
+		if record is None:
+			record = self.records[instance_num] = {
+				'outcomes': deque(maxlen=self.window),
+				'latencies': deque(maxlen=self.window),
+				'circuits': deque(maxlen=self.window),
+				'proxy_errors': 0,
+				'app_errors': 0}
+		return record
+
+	def record_success(self, instance_num, seconds):
+		'''Records a successful action.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			seconds (float): The time spent in the user function.'''
+		with self.lock:
+			record = self.record(instance_num)
+			record['outcomes'].append(True)
+			record['latencies'].append(seconds)
+			record['proxy_errors'] = 0
+			record['app_errors'] = 0
+
+	def record_failure(self, instance_num, proxy_error):
+		'''Records a failed attempt.
+		Only proxy and circuit failures count against the success rate of the instance:
+		an error of the user function says nothing about the Tor instance it ran on.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			proxy_error (bool): True if the proxy or circuit failed, False if the user function did.'''
+		with self.lock:
+			record = self.record(instance_num)
+			if proxy_error:
+				record['outcomes'].append(False)
+				record['proxy_errors'] += 1
+			else:
+				record['app_errors'] += 1
+
+	def record_circuit(self, instance_num, seconds):
+		'''Records the time it took to get a fresh circuit.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			seconds (float): The duration of the rotation.'''
+		with self.lock:
+			self.record(instance_num)['circuits'].append(seconds)
+
+	def proxy_dead(self, instance_num):
+		'''Checks whether the proxy of an instance failed max_proxy_errors times in a row.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			bool: True if retrying on this instance is pointless, False otherwise.'''
+		with self.lock:
+			record = self.records.get(instance_num)
+			return bool(record) and record['proxy_errors'] >= self.max_proxy_errors
+
+	def latency(self, record):
+		'''Returns the mean cost of an action on an instance, from its action latencies and circuit build times.
+		Must be called while holding lock.
+		Args:
+			record (dict): The health record of the instance.
+		Returns:
+			float: The mean latency in seconds, or None if fewer than 3 actions succeeded.'''
+		if len(record['latencies']) < 3:
+			return None
+		return mean(record['latencies']) + (mean(record['circuits']) if record['circuits'] else 0.0)
+
+	def rank(self, record):
+		'''Returns the scheduling score of a health record. Must be called while holding lock.
+		Args:
+			record (dict): The health record of the instance.
+		Returns:
+			float: The mean latency divided by the success rate, or None without enough history.'''
+		latency = self.latency(record)
+		if latency is None:
+			return None
+		return latency / max(sum(record['outcomes']) / len(record['outcomes']), 0.1)
+
+	def score(self, instance_num):
+		'''Ranks an instance for scheduling, the lower the better.
+		Instances without enough history, such as freshly rebuilt ones, get the median score of the pool.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			float: The mean latency divided by the success rate.'''
+		with self.lock:
+			record = self.records.get(instance_num)
+			score = self.rank(record) if record else None
+			if score is None:
+				scores = [rank for rank in map(self.rank, self.records.values()) if rank is not None]
+				return median(scores) if scores else 0.0
+			return score
+
+	def verdict(self, instance_num):
+		'''Checks whether an instance should be rebuilt rather than rotated.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			str: The reason to rebuild the instance, or None if it is healthy.'''
+		with self.lock:
+			record = self.records.get(instance_num)
+			if not record:
+				return None
+			if record['proxy_errors'] >= self.max_proxy_errors:
+				return f'{record["proxy_errors"]} consecutive proxy errors'
+			outcomes = record['outcomes']
+			if len(outcomes) >= max(2, self.window // 2):
+				success_rate = sum(outcomes) / len(outcomes)
+				if success_rate < self.min_success_rate:
+					return f'{success_rate:.0%} success rate'
+			latency = self.latency(record)
+			if self.slow_factor and latency is not None:
+				others = [self.latency(other) for n, other in self.records.items() if n != instance_num]
+				others = [other for other in others if other is not None]
+				if len(others) >= 2 and latency > self.slow_factor * median(others):
+					return f'{latency:.2f}s per action against {median(others):.2f}s for the pool'
+		return None
+
+	def reset(self, instances=None):
+		'''Forgets the records of the given instances, or of every instance.
+		Args:
+			instances (list, optional): The indexes of the Tor instances to forget.'''
+		with self.lock:
+			if instances is None:
+				self.records.clear()
+			else:
+				for instance_num in instances:
+					self.records.pop(instance_num, None)
+# by azuk4r
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+from bisect import bisect_left
+from threading import Lock
+from json import dumps
+from time import time
+
+class Metrics:
+	'''Metrics:
+	Thread-safe duration histograms and event counters, recorded per Tor instance,
+	exportable as a JSON snapshot or in the Prometheus text exposition format.'''
+	BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+	def __init__(self, buckets=None):
+		'''Initializes the Metrics object.
+		Args:
+			buckets (tuple): Upper bounds in seconds of the histogram buckets, by default Metrics.BUCKETS.'''
+		self.buckets = tuple(sorted(buckets or self.BUCKETS))
+		self.lock = Lock()
+		self.histograms = {}
+		self.counters = {}
+
+	def observe(self, phase, seconds, instance_num=None):
+		'''Records the duration of a phase.
+		Args:
+			phase (str): The name of the phase, e.g. 'bootstrap' or 'driver_launch'.
+			seconds (float): The duration of the phase.
+			instance_num (int, optional): The index of the Tor instance the phase ran for.'''
+		index = bisect_left(self.buckets, seconds)
+		with self.lock:
+			histogram = self.histograms.get((phase, instance_num))
+			if histogram is None:
+				histogram = self.histograms[(phase, instance_num)] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+			histogram['buckets'][index] += 1
+			histogram['sum'] += seconds
+			histogram['count'] += 1
+
+	def increment(self, counter, instance_num=None, amount=1):
+		'''Increments an event counter.
+		Args:
+			counter (str): The name of the counter, e.g. 'retries' or 'failures'.
+			instance_num (int, optional): The index of the Tor instance the event happened on.
+			amount (int): The value to add.'''
+		with self.lock:
+			self.counters[(counter, instance_num)] = self.counters.get((counter, instance_num), 0) + amount
+
+	@contextmanager
+	def timer(self, phase, instance_num=None):
+		'''Records the duration of the enclosed block as a phase, whether it succeeds or raises.
+		Args:
+			phase (str): The name of the phase.
+			instance_num (int, optional): The index of the Tor instance the phase runs for.'''
+		start = time()
+		try:
+			yield
+		finally:
+			self.observe(phase, time() - start, instance_num)
+
+	def reset(self):
+		'''Discards every recorded duration and counter.'''
+		with self.lock:
+			self.histograms.clear()
+			self.counters.clear()
+
+	def cumulative(self, counts):
+		'''Converts per-bucket counts into cumulative counts, as histograms are exported.
+		Args:
+			counts (list): The number of observations falling in each bucket.
+		Returns:
+			list: The number of observations lower than or equal to each bucket bound, +Inf last.'''
+		total, cumulative = 0, []
+		for count in counts:
+			total += count
+			cumulative.append(total)
+		return cumulative
+
+	def snapshot(self):
+		'''Returns a copy of the metrics as plain data.
+		Returns:
+			dict: 'phases' maps each phase to its histogram over all instances ('total') and per instance
+				('instances'), each with 'count', 'sum' and cumulative 'buckets' keyed by upper bound.
+				'counters' maps each counter to its 'total' and per instance values.'''
+		bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+		with self.lock:
+			histograms = {key: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']} for key, h in self.histograms.items()}
+			counters = dict(self.counters)
+		phases = {}
+		for (phase, instance_num), histogram in sorted(histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+			entry = phases.setdefault(phase, {'total': {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0}, 'instances': {}})
+			total = entry['total']
+			total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+			total['sum'] += histogram['sum']
+			total['count'] += histogram['count']
+			if instance_num is not None:
+				entry['instances'][str(instance_num)] = histogram
+		for entry in phases.values():
+			for histogram in [entry['total']] + list(entry['instances'].values()):
+				histogram['buckets'] = dict(zip(bounds, self.cumulative(histogram['buckets'])))
+		events = {}
+		for (counter, instance_num), value in sorted(counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+			entry = events.setdefault(counter, {'total': 0, 'instances': {}})
+			entry['total'] += value
+			if instance_num is not None:
+				entry['instances'][str(instance_num)] = value
+		return {'phases': phases, 'counters': events}
+
+	def to_json(self, indent=None):
+		'''Returns the snapshot of the metrics serialized as JSON.
+		Args:
+			indent (int, optional): The indentation of the JSON document.
+		Returns:
+			str: The JSON snapshot.'''
+		return dumps(self.snapshot(), indent=indent)
+
+	def to_prometheus(self, prefix='torsel'):
+		'''Returns the metrics in the Prometheus text exposition format.
+		Phases are exported as the <prefix>_phase_seconds histogram and counters as <prefix>_events_total,
+		labelled by phase or event and by instance.
+		Args:
+			prefix (str): The prefix of the metric names.
+		Returns:
+			str: The exposition text.'''
+		bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+		with self.lock:
+			histograms = {key: (self.cumulative(h['buckets']), h['sum'], h['count']) for key, h in self.histograms.items()}
+			counters = dict(self.counters)
+		labels = lambda name, value, instance_num: f'{name}="{value}"' + ('' if instance_num is None else f',instance="{instance_num}"')
+		lines = [f'# HELP {prefix}_phase_seconds Duration of Torsel phases in seconds.', f'# TYPE {prefix}_phase_seconds histogram']
+		for (phase, instance_num), (buckets, total, count) in sorted(histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+			label = labels('phase', phase, instance_num)
+			for bound, value in zip(bounds, buckets):
+				lines.append(f'{prefix}_phase_seconds_bucket{{{label},le="{bound}"}} {value}')
+			lines.append(f'{prefix}_phase_seconds_sum{{{label}}} {total}')
+			lines.append(f'{prefix}_phase_seconds_count{{{label}}} {count}')
+		lines += [f'# HELP {prefix}_events_total Number of Torsel events.', f'# TYPE {prefix}_events_total counter']
+		for (counter, instance_num), value in sorted(counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+			lines.append(f'{prefix}_events_total{{{labels("event", counter, instance_num)}}} {value}')
+		return '\n'.join(lines) + '\n'
+# by azuk4r
@@ -1,30 +1,70 @@
+from asyncio import get_running_loop, ensure_future, gather, shield, wait, Event as AsyncEvent, Queue as AsyncQueue
+from stem import Signal, SocketError, CircStatus, CircPurpose, StreamStatus, InvalidArguments
+from os.path import join, abspath, exists, isabs, getmtime, dirname
 from selenium.webdriver.support import expected_conditions as EC
+from threading import Thread, Event, Condition, Semaphore, Lock
+from stem.control import Controller, EventType, Listener
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from os.path import join, abspath, exists, isabs
+from urllib3.contrib.socks import SOCKSProxyManager
+from .health import InstanceHealth, is_proxy_error
+from concurrent.futures import ThreadPoolExecutor
 from socket import socket, AF_INET, SOCK_STREAM
 from selenium.webdriver.common.by import By
 from .cookies_manager import CookiesManager
+from os import makedirs, replace, remove
+from .action_source import ActionSource
+from inspect import iscoroutinefunction
 from subprocess import Popen, DEVNULL
 from selenium.webdriver import Chrome
-from stem.control import Controller
-from threading import Thread
-from shutil import rmtree
+from urllib.parse import urlsplit
+from shutil import rmtree, copy2
+from .exits import ExitRegistry
+from queue import Queue, Empty
+from functools import partial
+from collections import deque
+from .metrics import Metrics
+from time import sleep, time
 from random import choice
-from os import makedirs
-from queue import Queue
-from stem import Signal
-from time import sleep
+from json import loads
+from glob import glob
 from psutil import (
-	process_iter, 
     NoSuchProcess, 
-    TimeoutExpired, 
     AccessDenied, 
-    net_connections, 
+    wait_procs, 
     Process
 )
 
+# Directory information shared between Tor data directories
+TOR_CACHE_FILES = ('cached-certs', 'cached-microdesc-consensus', 'cached-microdescs', 'cached-microdescs.new')
+
+# User agents to pick from when no user_agent is specified
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.1 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/89.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36']
+
+# File extensions blocked through Chrome DevTools for each resource type of block_resources
+RESOURCE_EXTENSIONS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'mp3', 'ogg', 'wav', 'm4a', 'm3u8', 'mpd'),
+    'stylesheet': ('css',)}
+
+def resource_patterns(resource):
+	'''Returns the URL patterns of a resource type, in the URLPattern syntax of the urlPatterns of Network.setBlockedURLs.
+	The extension is matched against the end of the URL path alone, unlike the legacy urls patterns
+	whose pieces Chrome finds anywhere in the URL, hostnames included.
+	Args:
+		resource (str): A resource type of RESOURCE_EXTENSIONS.
+	Returns:
+		list: The URLPattern strings matching the paths ending with the extensions, whatever the query string.'''
+	return [f'*://*:*/*.{extension}?*' for extension in RESOURCE_EXTENSIONS[resource]]
+
 class Torsel:
 	'''Torsel:
 	A Python module for managing Tor instances with Selenium.
@@ -41,7 +81,32 @@ class Torsel:
 			  headless=False, 
 			  verbose=False, 
 			  cookies_dir=None, 
-			  cookies_mapping=None
+			  cookies_mapping=None,
+			  bootstrap_timeout=60,
+			  warmup_threads=10,
+			  min_ready_instances=None,
+			  rotation_timeout=10,
+			  reuse_drivers=False,
+			  driver_max_actions=None,
+			  driver_max_age=None,
+			  prelaunch_drivers=False,
+			  instances_per_process=1,
+			  tor_cache_dir=None,
+			  tor_cache_max_age=3600,
+			  persist_tor_data=False,
+			  auto_ports=False,
+			  cdp_cookies=False,
+			  driver_factory=None,
+			  health_window=20,
+			  max_proxy_errors=2,
+			  min_success_rate=0.5,
+			  slow_instance_factor=None,
+			  exit_reuse_window=None,
+			  max_exit_rerolls=3,
+			  page_load_strategy=None,
+			  block_resources=None,
+			  blocked_urls=None,
+			  track_network=False
 			  ): # sad feelings
 		'''Initializes the Torsel object with the given parameters.
 		Args:
@@ -55,11 +120,38 @@ class Torsel:
 			headless (bool): Run Selenium in headless mode if True.
 			verbose (bool): If True, print logs to the console.
 			cookies_dir (str): Directory to store and load cookies.
-			cookies_mapping (dict): Mapping of domains to specific cookie files based on instance number.'''
+			cookies_mapping (dict): Mapping of domains to specific cookie files based on instance number.
+			bootstrap_timeout (float): Seconds to wait for a Tor instance to finish bootstrapping before giving up.
+			warmup_threads (int): Maximum number of Tor instances bootstrapping at the same time during warm-up.
+			min_ready_instances (int): Number of ready instances required before actions are dispatched, if None all of them.
+			rotation_timeout (float): Maximum seconds to wait for tor to build a fresh circuit after a NEWNYM signal.
+			reuse_drivers (bool): If True, keep browsers warm across actions of the same instance instead of relaunching them.
+			driver_max_actions (int): Number of actions after which a reused browser is recycled, if None no limit.
+			driver_max_age (float): Seconds after which a reused browser is recycled, if None no limit.
+			prelaunch_drivers (bool): If True, launch the next browser of an instance in the background while the current action and rotation run.
+			instances_per_process (int): Number of instances served by each Tor process, each one on its own isolated SocksPort.
+			tor_cache_dir (str): Directory of a shared consensus and descriptor cache used to seed new Tor data directories.
+			tor_cache_max_age (float): Seconds after which the shared cache is refreshed from a freshly bootstrapped instance.
+			persist_tor_data (bool): If True, keep the Tor data directories, and with them the guard state, across runs.
+			auto_ports (bool): If True, let Tor pick free SOCKS and control ports itself instead of probing from the base ports.
+			cdp_cookies (bool): If True, set cookies through Chrome DevTools before the first page load instead of loading and refreshing the page.
+			driver_factory (callable): A function receiving the configured Chrome Options and returning a WebDriver, if None Chrome is launched.
+			health_window (int): Number of recent actions and rotations kept in the health record of each instance.
+			max_proxy_errors (int): Consecutive proxy errors after which an instance stops being retried on and is rebuilt.
+			min_success_rate (float): Rate of attempts without proxy or circuit errors below which an instance is rebuilt with fresh guards.
+			slow_instance_factor (float): An instance slower than the median instance by this factor is rebuilt, if None never.
+				The latency includes the user function, so only enable it when every action does comparable work.
+			exit_reuse_window (float): Seconds during which an exit relay used by an action is avoided by new circuits, if None exits are not checked.
+			max_exit_rerolls (int): Maximum number of fresh circuits discarded per rotation because their exit was used recently.
+			page_load_strategy (str): Chrome page load strategy, 'normal', 'eager' (return once the DOM is ready) or 'none', if None Chrome's default.
+			block_resources (list): Resource types browsers do not download, among 'image', 'font', 'media' and 'stylesheet'.
+			blocked_urls (list): URL patterns browsers do not request, whose pieces between * wildcards Chrome finds anywhere in the URL, e.g. '*google-analytics.com*'.
+			track_network (bool): If True, count the requests, blocked requests and bytes received by browsers, always on when something is blocked.'''
 		self.total_instances = total_instances
 		self.max_threads = max_threads
-		self.tor_base_port = self.find_available_port(tor_base_port)
-		self.tor_control_base_port = self.find_available_port(tor_control_base_port)
+		self.auto_ports = auto_ports
+		self.tor_base_port = tor_base_port if auto_ports else self.find_available_port(tor_base_port)
+		self.tor_control_base_port = tor_control_base_port if auto_ports else self.find_available_port(tor_control_base_port)
 		self.tor_path = abspath(tor_path)
 		self.tor_data_dir = abspath(tor_data_dir)
 		self.user_agent = user_agent
@@ -67,13 +159,121 @@ class Torsel:
 		self.verbose = verbose
 		self.cookies_dir = abspath(cookies_dir) if cookies_dir else None
 		self.cookies_mapping = cookies_mapping
+		self.cookies_index = self.build_cookies_index(cookies_mapping)
+		self.bootstrap_timeout = bootstrap_timeout
+		self.warmup_threads = warmup_threads
+		self.min_ready_instances = min_ready_instances
+		self.rotation_timeout = rotation_timeout
+		self.reuse_drivers = reuse_drivers
+		self.driver_max_actions = driver_max_actions
+		self.driver_max_age = driver_max_age
+		self.prelaunch_drivers = prelaunch_drivers
+		self.instances_per_process = max(1, instances_per_process)
+		self.tor_cache_dir = abspath(tor_cache_dir) if tor_cache_dir else None
+		self.tor_cache_max_age = tor_cache_max_age
+		self.persist_tor_data = persist_tor_data
+		self.cdp_cookies = cdp_cookies
+		self.driver_factory = driver_factory
+		self.metrics = Metrics()
+		self.health = InstanceHealth(health_window, max_proxy_errors, min_success_rate, slow_instance_factor)
+		self.exits = ExitRegistry()
+		self.exit_reuse_window = exit_reuse_window
+		self.max_exit_rerolls = max_exit_rerolls
+		self.page_load_strategy = page_load_strategy
+		self.block_resources = set(block_resources or ())
+		unknown = self.block_resources - set(RESOURCE_EXTENSIONS)
+		if unknown:
+			raise ValueError(f'Unknown resource types {sorted(unknown)}, expected some of {sorted(RESOURCE_EXTENSIONS)}')
+		self.blocked_resources = [pattern for resource in sorted(self.block_resources) for pattern in resource_patterns(resource)]
+		self.blocked_urls = list(blocked_urls or ())
+		self.track_network = track_network or bool(self.blocked_resources or self.blocked_urls)
+		self.tor_cache_lock = Lock()
 		self.tor_processes = {}
+		self.socks_ports = {}
+		self.control_ports = {}
+		self.ready_instances = set()
+		self.idle_instances = deque()
+		self.leases = {}
+		self.recycle_threads = []
+		self.restarting_processes = set()
+		self.instance_events = {}
+		self.instances_ready = Condition()
+		self.lease_waiters = {}
+		self.tor_controllers = {}
+		self.controllers_lock = Lock()
+		self.instance_circuits = {}
+		self.circuits_lock = Lock()
+		self.driver_pool = {}
+		self.http_sessions = {}
+		self.prelaunched_drivers = {}
+		self.driver_pool_lock = Lock()
+		self.pool_running = False
+		self.pool_threads = []
 		# Initialize the CookiesManager if either cookies_dir or cookies_mapping is provided
 		if cookies_dir or cookies_mapping:
 			self.cookies_manager = CookiesManager(base_dir=cookies_dir, verbose=verbose)
 		else:
 			self.cookies_manager = None
 
+	def __enter__(self):
+		'''Starts the Tor instances for the runs of the with block.'''
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		'''Stops the Tor instances at the end of the with block.'''
+		self.close()
+
+	async def __aenter__(self):
+		'''Starts the Tor instances for the runs of the async with block, off the event loop.'''
+		return await get_running_loop().run_in_executor(None, self.start)
+
+	async def __aexit__(self, *exc_info):
+		'''Stops the Tor instances at the end of the async with block, off the event loop.'''
+		await get_running_loop().run_in_executor(None, self.close)
+
+	def start(self):
+		'''Starts the Tor instances once, to serve several runs.
+		Until close is called, run, imap and arun reuse the running instances, their controllers and,
+		with reuse_drivers, their browsers, instead of bootstrapping and cleaning up for each run.
+		Returns:
+			Torsel: This Torsel object, so it can be used as a context manager.'''
+		if not self.pool_running:
+			self.clean_up()
+			self.pool_threads = self.warm_up()
+			self.pool_running = True
+		return self
+
+	def close(self):
+		'''Stops the Tor instances started by start, once the rotations in progress are over.'''
+		if not self.pool_running:
+			return
+		self.pool_running = False
+		self.join_threads(self.pool_threads)
+		self.pool_threads = []
+		self.clean_up()
+
+	def prepare_run(self):
+		'''Gets the Tor instances ready for a run.
+		Outside of start and close, each run starts from a clean state and bootstraps its own instances.
+		Returns:
+			list: The warm-up threads started for the run, none if the instances are already running.'''
+		if self.pool_running:
+			return []
+		self.clean_up()
+		return self.warm_up()
+
+	def finish_run(self, threads):
+		'''Waits for the threads of a run, then cleans up unless the instances outlive the run.
+		Instances started by start are left rotating in the background, ready for the next run.
+		Args:
+			threads (list): The worker and warm-up threads of the run.'''
+		if self.pool_running:
+			for t in threads:
+				t.join()
+			return
+		self.join_threads(threads)
+		self.clean_up()
+
 	def log(self, message):
 		'''Logs a message to the console if verbose mode is enabled.
 		Args:
@@ -93,65 +293,411 @@ class Torsel:
 			start_port += 1
 
 	def clean_up(self):
-		'''Cleans up any previous Tor processes, files, and ports.
-		Kills any running Tor processes, frees up occupied ports, and removes old Tor profile directories.'''
-		self.log('[~] Cleaning up previous processes, files, and ports...')
-		for proc in process_iter(['name']):
+		'''Cleans up the Tor processes and files owned by this Torsel object.
+		Terminates the registered Tor processes, and those a previous run left behind in tor_data_dir
+		according to their pidfiles, all in parallel. Then removes old Tor profile directories.'''
+		self.log('[~] Cleaning up previous processes and files...')
+		self.close_drivers()
+		for instance_num in list(self.http_sessions):
+			self.reset_http_session(instance_num)
+		with self.controllers_lock:
+			controllers = list(self.tor_controllers.values())
+			self.tor_controllers.clear()
+		for controller in controllers:
+			controller.close()
+		processes = self.owned_tor_processes()
+		for proc in processes:
 			try:
-				if proc.name() == 'tor':
-					proc.terminate()
-					proc.wait(timeout=5)
+				proc.terminate()
 			except NoSuchProcess:
 				pass
-			except TimeoutExpired:
-				proc.kill()
-		sleep(1)
-		for port in range(self.tor_base_port, self.tor_base_port + self.total_instances * 10, 10):
+		_, alive = wait_procs(processes, timeout=5)
+		for proc in alive:
 			try:
-				self.close_port(port)
-				self.close_port(port + 101)
-			except Exception as e:
-				self.log(f'[-] Error closing port {port}: {str(e)}')
-		if exists(self.tor_data_dir):
+				proc.kill()
+			except NoSuchProcess:
+				pass
+		wait_procs(alive, timeout=5)
+		self.tor_processes.clear()
+		self.ready_instances.clear()
+		self.idle_instances.clear()
+		self.leases.clear()
+		self.instance_events.clear()
+		self.instance_circuits.clear()
+		self.exits.forget_process()
+		self.health.reset()
+		self.socks_ports.clear()
+		self.control_ports.clear()
+		if exists(self.tor_data_dir) and not self.persist_tor_data:
 			rmtree(self.tor_data_dir, ignore_errors=True)
 		self.log('[+] Cleanup completed.')
-		sleep(3)
 
-	def close_port(self, port):
-		'''Closes the specified port by terminating the associated process.
-		Args:
-			port (int): The port number to close.'''
-		for conn in net_connections():
-			if conn.laddr.port == port:
-				try:
-					process = Process(conn.pid)
-					process.terminate()
-					process.wait(timeout=5)
-				except NoSuchProcess:
-					pass
-				except AccessDenied:
-					self.log(f'[-] Access denied when trying to close port {port}')
-				except TimeoutExpired:
-					process.kill()
+	def owned_tor_processes(self):
+		'''Collects the running Tor processes owned by this Torsel object.
+		Those are the registered processes, plus the ones recorded in the pidfiles of tor_data_dir by a previous run.
+		Returns:
+			list: The psutil Process objects to terminate.'''
+		pids = {tor_process.pid for tor_process in list(self.tor_processes.values()) if tor_process.poll() is None}
+		for pid_file in glob(join(self.tor_data_dir, 'tor*', 'tor.pid')):
+			try:
+				with open(pid_file) as file:
+					pid = int(file.read().strip())
+				# Make sure the pid was not recycled by an unrelated process
+				if dirname(pid_file) in ' '.join(Process(pid).cmdline()):
+					pids.add(pid)
+			except (OSError, ValueError, NoSuchProcess, AccessDenied):
+				pass
+		processes = []
+		for pid in pids:
+			try:
+				processes.append(Process(pid))
+			except NoSuchProcess:
+				pass
+		return processes
 
 	def create_tor_instance(self, instance_num):
 		'''Creates and configures a Tor instance with the specified instance number.
+		Waits until the instance has fully bootstrapped instead of sleeping a fixed amount of time.
+		If instances_per_process is greater than 1, the Tor process serving this instance and
+		its siblings is started, with one isolated SocksPort per instance.
 		Args:
-			instance_num (int): The index of the Tor instance.'''
-		self.log(f'[~] Creating Tor instance {instance_num}...')
-		instance_dir = join(self.tor_data_dir, f'tor{instance_num}')
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			bool: True if the instance bootstrapped and is ready, False otherwise.'''
+		process_num = self.process_num(instance_num)
+		instances = self.process_instances(process_num)
+		instance_dir = join(self.tor_data_dir, f'tor{process_num}')
 		makedirs(instance_dir, exist_ok=True)
-		torrc_content = f'''SocksPort {self.tor_base_port + instance_num * 10}
-		ControlPort {self.tor_control_base_port + instance_num * 10}
-		DataDirectory {instance_dir}'''
+		if self.auto_ports:
+			self.control_ports.pop(process_num, None)
+			for n in instances:
+				self.socks_ports.pop(n, None)
+			port_file = join(instance_dir, 'control_port')
+			if exists(port_file):
+				remove(port_file)
+			control_port = 'auto'
+			# Tor reports the port it picked in this file, read by control_port()
+			control_port_file = f'ControlPortWriteToFile {port_file}'
+		else:
+			control_port = self.tor_control_base_port + process_num * 10
+			control_port_file = ''
+		if self.instances_per_process > 1:
+			self.log(f'[~] Creating Tor process {process_num} for instances {instances[0]}-{instances[-1]}...')
+			socks_ports = '\n'.join(
+				f'SocksPort {self.socks_port(n)} IsolateClientAddr IsolateSOCKSAuth SessionGroup={n}' for n in instances)
+		else:
+			self.log(f'[~] Creating Tor instance {instance_num}...')
+			socks_ports = f'SocksPort {self.socks_port(instance_num)}'
+		if self.tor_cache_dir:
+			self.seed_tor_cache(instance_dir)
+		torrc_content = f'''{socks_ports}
+		ControlPort {control_port}
+		{control_port_file}
+		DataDirectory {instance_dir}
+		PidFile {join(instance_dir, 'tor.pid')}'''
 		torrc_path = join(instance_dir, 'torrc')
 		with open(torrc_path, 'w') as torrc_file:
 			torrc_file.write(torrc_content)
+		start = time()
 		tor_process = Popen([self.tor_path, '-f', torrc_path], stdout=DEVNULL, stderr=DEVNULL)
-		self.tor_processes[instance_num] = tor_process
-		sleep(10)
-		self.log(f'[+] Tor instance {instance_num} created and running.')
-		self.rotate_tor_ip(instance_num)
+		self.tor_processes[process_num] = tor_process
+		if not self.wait_for_bootstrap(instance_num):
+			self.metrics.increment('bootstrap_failures', instance_num)
+			self.close_controller(instance_num)
+			tor_process.kill()
+			tor_process.wait()
+			del self.tor_processes[process_num]
+			return False
+		self.metrics.observe('bootstrap', time() - start, instance_num)
+		if self.tor_cache_dir:
+			self.refresh_tor_cache(instance_dir)
+		if self.auto_ports and not self.register_socks_ports(process_num):
+			self.close_controller(instance_num)
+			tor_process.kill()
+			tor_process.wait()
+			del self.tor_processes[process_num]
+			return False
+		try:
+			controller = self.get_controller(instance_num)
+			controller.add_event_listener(partial(self.track_circuit, process_num), EventType.CIRC)
+			controller.add_event_listener(partial(self.track_stream, process_num), EventType.STREAM)
+		except Exception as e:
+			self.log(f'[-] Failed to track circuits of Tor process {process_num}: {e}')
+		with self.instances_ready:
+			self.ready_instances.update(instances)
+			self.idle_instances.extend(n for n in instances if n not in self.leases and n not in self.idle_instances)
+			self.notify_instances()
+		if self.instances_per_process > 1:
+			self.log(f'[+] Tor process {process_num} created and running for instances {instances[0]}-{instances[-1]}.')
+		else:
+			self.log(f'[+] Tor instance {instance_num} created and running.')
+		return True
+
+	def seed_tor_cache(self, instance_dir):
+		'''Copies the shared consensus, descriptors and certificates into a Tor data directory,
+		unless the directory already holds a newer copy.
+		Args:
+			instance_dir (str): The Tor data directory to seed.'''
+		for name in TOR_CACHE_FILES:
+			cached = join(self.tor_cache_dir, name)
+			target = join(instance_dir, name)
+			try:
+				if exists(cached) and (not exists(target) or getmtime(target) < getmtime(cached)):
+					copy2(cached, target)
+			except OSError as e:
+				self.log(f'[-] Failed to seed {name} into {instance_dir}: {e}')
+
+	def refresh_tor_cache(self, instance_dir):
+		'''Updates the shared cache from a bootstrapped Tor data directory if the cache is missing or stale.
+		Files are replaced atomically, so instances being seeded never read a partial copy.
+		Args:
+			instance_dir (str): The data directory of a freshly bootstrapped Tor instance.'''
+		with self.tor_cache_lock:
+			consensus = join(self.tor_cache_dir, 'cached-microdesc-consensus')
+			if exists(consensus) and time() - getmtime(consensus) < self.tor_cache_max_age:
+				return
+			makedirs(self.tor_cache_dir, exist_ok=True)
+			for name in TOR_CACHE_FILES:
+				source = join(instance_dir, name)
+				if not exists(source):
+					continue
+				temp = join(self.tor_cache_dir, f'{name}.tmp')
+				try:
+					copy2(source, temp)
+					replace(temp, join(self.tor_cache_dir, name))
+				except OSError as e:
+					self.log(f'[-] Failed to refresh cached {name}: {e}')
+			self.log(f'[+] Shared Tor cache refreshed from {instance_dir}.')
+
+	def restart_tor_instance(self, instance_num, fresh_guards=False):
+		'''Terminates the Tor process serving an instance and creates it again.
+		The instances sharing the process stop being leased, and the process is only terminated once
+		those in the middle of an action are done. A process is restarted by one thread at a time.
+		Args:
+			instance_num (int): The index of the Tor instance, leased by the caller.
+			fresh_guards (bool): If True, discard the Tor state file so the new process picks new entry guards.
+		Returns:
+			bool: True if the instance bootstrapped again, False otherwise, or if another thread is
+				already restarting the process, which makes its instances idle again once it is over.'''
+		process_num = self.process_num(instance_num)
+		instances = self.process_instances(process_num)
+		with self.instances_ready:
+			if process_num in self.restarting_processes:
+				self.log(f'[~] Tor process {process_num} is already being restarted.')
+				return False
+			self.restarting_processes.add(process_num)
+			self.ready_instances.difference_update(instances)
+			for n in instances:
+				if n in self.idle_instances:
+					self.idle_instances.remove(n)
+			# Siblings in the middle of an action keep the process until they release it
+			self.instances_ready.wait_for(lambda: not any(n in self.leases for n in instances if n != instance_num))
+		try:
+			self.health.reset(instances)
+			self.exits.forget_process(process_num, instances)
+			self.close_controller(instance_num)
+			tor_process = self.tor_processes.pop(process_num, None)
+			if tor_process is not None:
+				tor_process.terminate()
+				tor_process.wait()
+			state_file = join(self.tor_data_dir, f'tor{process_num}', 'state')
+			if fresh_guards and exists(state_file):
+				remove(state_file)
+			# Browsers and HTTP sessions still point at the SOCKS ports of the terminated process
+			self.close_drivers(instances)
+			for n in instances:
+				self.reset_http_session(n)
+			return self.create_tor_instance(instance_num)
+		finally:
+			with self.instances_ready:
+				self.restarting_processes.discard(process_num)
+				self.notify_instances()
+
+	def process_num(self, instance_num):
+		'''Returns the index of the Tor process serving an instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			int: The index of the Tor process, equal to instance_num unless instances_per_process is greater than 1.'''
+		return instance_num // self.instances_per_process
+
+	def process_instances(self, process_num):
+		'''Returns the instances served by a Tor process.
+		Args:
+			process_num (int): The index of the Tor process.
+		Returns:
+			range: The instance numbers served by the process.'''
+		first = process_num * self.instances_per_process
+		return range(first, min(first + self.instances_per_process, self.total_instances))
+
+	def socks_port(self, instance_num):
+		'''Returns the SOCKS port of a Tor instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			int or str: The SOCKS port number, or 'auto' if Tor has not reported it yet when using auto_ports.'''
+		if self.auto_ports:
+			return self.socks_ports.get(instance_num, 'auto')
+		return self.tor_base_port + instance_num * 10
+
+	def control_port(self, process_num):
+		'''Returns the control port of a Tor process.
+		When using auto_ports, the port is read from the file Tor writes once the port is open.
+		Args:
+			process_num (int): The index of the Tor process.
+		Returns:
+			int: The control port number.
+		Raises:
+			SocketError: If Tor has not written its control port yet.'''
+		if not self.auto_ports:
+			return self.tor_control_base_port + process_num * 10
+		if process_num not in self.control_ports:
+			try:
+				with open(join(self.tor_data_dir, f'tor{process_num}', 'control_port')) as port_file:
+					# e.g. PORT=127.0.0.1:45123
+					self.control_ports[process_num] = int(port_file.read().strip().rsplit(':', 1)[1])
+			except (OSError, IndexError, ValueError):
+				raise SocketError(f'Control port of Tor process {process_num} is not available yet')
+		return self.control_ports[process_num]
+
+	def register_socks_ports(self, process_num):
+		'''Reads the SOCKS ports Tor picked for a process and records them for its instances.
+		Args:
+			process_num (int): The index of the Tor process.
+		Returns:
+			bool: True if a port was found for every instance served by the process, False otherwise.'''
+		instances = self.process_instances(process_num)
+		try:
+			# Listeners are reported in the order of the SocksPort lines of the torrc
+			listeners = self.get_controller(instances[0]).get_listeners(Listener.SOCKS)
+		except Exception as e:
+			self.log(f'[-] Failed to read the SOCKS ports of Tor process {process_num}: {e}')
+			return False
+		if len(listeners) < len(instances):
+			self.log(f'[-] Tor process {process_num} opened {len(listeners)} SOCKS ports for {len(instances)} instances.')
+			return False
+		for instance_num, (_, port) in zip(instances, listeners):
+			self.socks_ports[instance_num] = int(port)
+		return True
+
+	def warm_up(self):
+		'''Bootstraps all Tor instances concurrently before any action is dispatched.
+		At most warmup_threads instances bootstrap at the same time. Returns as soon as min_ready_instances
+		are ready (or every instance has been attempted), the rest keep bootstrapping in the background.
+		Returns:
+			list: The warm-up threads, to be joined once the run is over.'''
+		pending = Queue()
+		for instance_num in range(self.total_instances):
+			self.instance_events[instance_num] = Event()
+		for instance_num in range(0, self.total_instances, self.instances_per_process):
+			pending.put(instance_num)
+		required = self.min_ready_instances or self.total_instances
+		self.log(f'[~] Warming up {self.total_instances} Tor instances, waiting for {required} to be ready...')
+		threads = []
+		for _ in range(min(pending.qsize(), max(1, self.warmup_threads))):
+			t = Thread(target=self.warm_up_worker, args=(pending,))
+			t.start()
+			threads.append(t)
+		events = list(self.instance_events.values())
+		with self.instances_ready:
+			self.instances_ready.wait_for(
+				lambda: len(self.ready_instances) >= required or all(event.is_set() for event in events))
+		self.log(f'[+] {len(self.ready_instances)} Tor instances ready, dispatching actions.')
+		return threads
+
+	def warm_up_worker(self, pending):
+		'''Creates Tor instances taken from the pending queue until it is empty.
+		Args:
+			pending (Queue): The queue containing the instance numbers to create.'''
+		while True:
+			try:
+				instance_num = pending.get_nowait()
+			except Empty:
+				return
+			try:
+				self.create_tor_instance(instance_num)
+			except Exception as e:
+				self.log(f'[-] Failed to create Tor instance {instance_num}: {e}')
+			finally:
+				# Waiters must learn the outcome, or they wait for an instance that will never be ready
+				with self.instances_ready:
+					for sibling in self.process_instances(self.process_num(instance_num)):
+						self.instance_events[sibling].set()
+					self.notify_instances()
+
+	def wait_for_bootstrap(self, instance_num):
+		'''Polls the control port of a Tor instance until it reports 100% bootstrap progress.
+		The controller opened here is kept as the long-lived controller of the instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			bool: True if the instance bootstrapped within bootstrap_timeout, False otherwise.'''
+		tor_process = self.tor_processes[self.process_num(instance_num)]
+		deadline = time() + self.bootstrap_timeout
+		progress = 0
+		while time() < deadline:
+			if tor_process.poll() is not None:
+				self.log(f'[-] Tor instance {instance_num} exited with code {tor_process.returncode} while bootstrapping.')
+				return False
+			try:
+				controller = self.get_controller(instance_num)
+				progress = self.parse_bootstrap_progress(controller.get_info('status/bootstrap-phase'))
+				if progress >= 100:
+					return True
+			except SocketError:
+				# The control port is not listening yet or tor dropped the connection
+				pass
+			sleep(0.25)
+		self.log(f'[-] Tor instance {instance_num} did not bootstrap within {self.bootstrap_timeout}s (stuck at {progress}%).')
+		return False
+
+	def get_controller(self, instance_num):
+		'''Returns the long-lived, authenticated controller of a Tor instance.
+		The controller is opened on first use and reconnected if its socket died.
+		Instances served by the same Tor process share its controller.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			Controller: The controller owned by the instance.
+		Raises:
+			SocketError: If the control port cannot be reached.'''
+		process_num = self.process_num(instance_num)
+		with self.controllers_lock:
+			controller = self.tor_controllers.get(process_num)
+			if controller is None:
+				with self.metrics.timer('controller_connect', instance_num):
+					controller = Controller.from_port(port=self.control_port(process_num))
+					try:
+						controller.authenticate()
+					except Exception:
+						controller.close()
+						raise
+				self.tor_controllers[process_num] = controller
+			elif not controller.is_alive():
+				self.log(f'[~] Reconnecting controller of Tor instance {instance_num}...')
+				with self.metrics.timer('controller_connect', instance_num):
+					controller.reconnect()
+			return controller
+
+	def close_controller(self, instance_num):
+		'''Closes and forgets the controller of a Tor instance, if it has one.
+		Args:
+			instance_num (int): The index of the Tor instance.'''
+		with self.controllers_lock:
+			controller = self.tor_controllers.pop(self.process_num(instance_num), None)
+		if controller is not None:
+			controller.close()
+
+	def parse_bootstrap_progress(self, bootstrap_phase):
+		'''Extracts the progress percentage from a status/bootstrap-phase reply.
+		Args:
+			bootstrap_phase (str): The reply, e.g. 'NOTICE BOOTSTRAP PROGRESS=100 TAG=done SUMMARY="Done"'.
+		Returns:
+			int: The bootstrap progress, or 0 if it cannot be determined.'''
+		for field in bootstrap_phase.split():
+			if field.startswith('PROGRESS='):
+				return int(field[len('PROGRESS='):])
+		return 0
 
 	def configure_selenium_with_tor(self, instance_num):
 		'''Configures Selenium WebDriver to use a Tor instance as a proxy.
@@ -160,14 +706,7 @@ class Torsel:
 		Returns:
 			WebDriver, WebDriverWait, By, EC: Configured Selenium WebDriver instance and related utilities.'''
 		if not self.user_agent:
-			user_agents = [
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36',
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0',
-                'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.1 Safari/605.1.15',
-                'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/89.0',
-                'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-                'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36']
-			user_agent = choice(user_agents)
+			user_agent = choice(USER_AGENTS)
 			chrome_options = Options()
 			chrome_options.add_argument(f'--user-agent={user_agent}')
 		else:
@@ -175,35 +714,411 @@ class Torsel:
 			chrome_options.add_argument(f'--user-agent={self.user_agent}')
 		if self.headless:
 			chrome_options.add_argument('--headless')
-		chrome_options.add_argument(f'--proxy-server=socks5://127.0.0.1:{self.tor_base_port + instance_num * 10}')
+		chrome_options.add_argument(f'--proxy-server=socks5://127.0.0.1:{self.socks_port(instance_num)}')
 		chrome_options.add_argument('--no-sandbox')
 		chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-		service = Service(log_path=DEVNULL)
-		driver = Chrome(service=service, options=chrome_options)
+		if self.page_load_strategy:
+			chrome_options.page_load_strategy = self.page_load_strategy
+		if 'image' in self.block_resources:
+			# Also keep Chrome from decoding images served inline or under unusual URLs
+			chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+		if self.track_network:
+			chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+		if self.driver_factory:
+			driver = self.driver_factory(chrome_options)
+		else:
+			service = Service(log_path=DEVNULL)
+			driver = Chrome(service=service, options=chrome_options)
 		wait = WebDriverWait(driver, 10)
 		return driver, wait, By, EC
 
+	def acquire_driver(self, instance_num):
+		'''Provides a WebDriver for a Tor instance, reusing a warm one from the pool when possible.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			dict: The pooled driver entry, holding the 'driver', 'wait', 'actions', 'created', 'context' and 'instance' keys.'''
+		while self.reuse_drivers:
+			with self.driver_pool_lock:
+				idle = self.driver_pool.get(instance_num)
+				entry = idle.pop() if idle else None
+			if entry is None:
+				break
+			if self.driver_expired(entry):
+				self.quit_driver(entry)
+				continue
+			try:
+				self.reset_driver(entry)
+				# DevTools settings belong to a tab, the fresh one needs them again
+				self.apply_blocked_urls(entry['driver'])
+				return entry
+			except Exception as e:
+				self.log(f'[-] Failed to reset browser for instance {instance_num}: {e}')
+				self.quit_driver(entry)
+		with self.driver_pool_lock:
+			pending = self.prelaunched_drivers.get(instance_num)
+			launch = pending.pop(0) if pending else None
+		if launch is not None:
+			entry = launch.get()
+			if entry is not None:
+				return entry
+		return self.launch_driver(instance_num)
+
+	def launch_driver(self, instance_num):
+		'''Launches a new WebDriver for a Tor instance.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			dict: A new driver entry.'''
+		with self.metrics.timer('driver_launch', instance_num):
+			driver, wait, _, _ = self.configure_selenium_with_tor(instance_num)
+			self.apply_blocked_urls(driver)
+		return {'driver': driver, 'wait': wait, 'actions': 0, 'created': time(), 'context': None, 'instance': instance_num}
+
+	def apply_blocked_urls(self, driver):
+		'''Blocks the requests of the current tab matching block_resources and blocked_urls, through Chrome DevTools.
+		A browser too old for the urlPatterns of Network.setBlockedURLs only blocks blocked_urls,
+		and images through its content settings.
+		Args:
+			driver (WebDriver): The WebDriver to configure.
+		Returns:
+			bool: True if the URLs are blocked or nothing is to be blocked, False otherwise.'''
+		if not self.blocked_resources and not self.blocked_urls:
+			return True
+		params = {'urls': self.blocked_urls} if self.blocked_urls else {}
+		if self.blocked_resources:
+			params['urlPatterns'] = [{'urlPattern': pattern, 'block': True} for pattern in self.blocked_resources]
+		try:
+			driver.execute_cdp_cmd('Network.enable', {})
+			try:
+				driver.execute_cdp_cmd('Network.setBlockedURLs', params)
+			except Exception as e:
+				if 'urlPatterns' not in params:
+					raise
+				self.log(f'[-] The browser cannot block resource types by URL path, only blocking blocked_urls: {e}')
+				driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+			return True
+		except Exception as e:
+			self.log(f'[-] Failed to block URLs in the browser: {e}')
+			return False
+
+	def record_network(self, entry):
+		'''Counts the requests, blocked requests and bytes received by a browser since the last call,
+		from its DevTools performance log, when track_network is enabled.
+		Args:
+			entry (dict): The driver entry.'''
+		if not self.track_network:
+			return
+		try:
+			messages = entry['driver'].get_log('performance')
+		except Exception as e:
+			self.log(f'[-] Failed to read the network log of instance {entry["instance"]}: {e}')
+			return
+		requests = blocked = received = 0
+		for message in messages:
+			try:
+				event = loads(message['message'])['message']
+			except (KeyError, TypeError, ValueError):
+				continue
+			if event.get('method') == 'Network.loadingFinished':
+				requests += 1
+				received += int(event['params'].get('encodedDataLength', 0))
+			elif event.get('method') == 'Network.loadingFailed' and event['params'].get('blockedReason'):
+				blocked += 1
+		self.metrics.increment('requests', entry['instance'], requests)
+		self.metrics.increment('blocked_requests', entry['instance'], blocked)
+		self.metrics.increment('bytes_received', entry['instance'], received)
+
+	def prelaunch_driver(self, instance_num, entry):
+		'''Starts launching the next WebDriver of a Tor instance in the background,
+		so it is ready as soon as the current action and the following rotation are over.
+		Nothing is launched if the current driver will be reused or a launch is already pending.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			entry (dict): The driver entry used by the current action.'''
+		if self.reuse_drivers and (self.driver_max_actions is None or entry['actions'] + 1 < self.driver_max_actions):
+			return
+		with self.driver_pool_lock:
+			pending = self.prelaunched_drivers.setdefault(instance_num, [])
+			if pending:
+				return
+			launch = Queue(maxsize=1)
+			pending.append(launch)
+		Thread(target=self.prelaunch_worker, args=(instance_num, launch)).start()
+
+	def prelaunch_worker(self, instance_num, launch):
+		'''Launches a WebDriver and hands it over through the given queue, or None if the launch failed.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			launch (Queue): The queue the driver entry is put into.'''
+		try:
+			launch.put(self.launch_driver(instance_num))
+		except Exception as e:
+			self.log(f'[-] Failed to prelaunch browser for instance {instance_num}: {e}')
+			launch.put(None)
+
+	def release_driver(self, instance_num, entry, reusable=True):
+		'''Returns a WebDriver to the pool of its Tor instance, or quits it if it cannot be reused.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			entry (dict): The driver entry obtained from acquire_driver.
+			reusable (bool): False if the driver may be in a broken state and must not be reused.'''
+		entry['actions'] += 1
+		self.record_network(entry)
+		if self.reuse_drivers and reusable and not self.driver_expired(entry):
+			with self.driver_pool_lock:
+				self.driver_pool.setdefault(instance_num, []).append(entry)
+		else:
+			self.quit_driver(entry)
+
+	def driver_expired(self, entry):
+		'''Checks whether a pooled driver has reached driver_max_actions or driver_max_age.
+		Args:
+			entry (dict): The driver entry to check.
+		Returns:
+			bool: True if the driver must be recycled, False otherwise.'''
+		if self.driver_max_actions is not None and entry['actions'] >= self.driver_max_actions:
+			return True
+		return self.driver_max_age is not None and time() - entry['created'] >= self.driver_max_age
+
+	def reset_driver(self, entry):
+		'''Clears the state left by the previous action in a pooled driver.
+		Opens a blank tab in a fresh CDP browser context, so cookies, storage and open connections
+		over the previous circuit are left behind. If the browser does not support browser contexts,
+		falls back to clearing cookies and storage on an about:blank page.
+		Args:
+			entry (dict): The driver entry to reset.'''
+		driver = entry['driver']
+		try:
+			context = driver.execute_cdp_cmd('Target.createBrowserContext', {'disposeOnDetach': False})['browserContextId']
+			target = driver.execute_cdp_cmd('Target.createTarget', {'url': 'about:blank', 'browserContextId': context})['targetId']
+		except Exception:
+			driver.delete_all_cookies()
+			driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+			driver.get('about:blank')
+			return
+		for handle in driver.window_handles:
+			if handle != target:
+				driver.switch_to.window(handle)
+				driver.close()
+		driver.switch_to.window(target)
+		if entry['context'] is not None:
+			driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': entry['context']})
+		entry['context'] = context
+
+	def quit_driver(self, entry):
+		'''Quits a WebDriver, ignoring errors from browsers that already died.
+		Args:
+			entry (dict): The driver entry to quit.'''
+		try:
+			with self.metrics.timer('driver_quit', entry['instance']):
+				entry['driver'].quit()
+		except Exception as e:
+			self.log(f'[-] Error quitting browser: {e}')
+
+	def close_drivers(self, instances=None):
+		'''Quits every idle driver kept in the pool, including prelaunched ones.
+		Args:
+			instances (iterable, optional): Only quit the drivers of these Tor instances.'''
+		with self.driver_pool_lock:
+			if instances is None:
+				instances = self.driver_pool.keys() | self.prelaunched_drivers.keys()
+			entries = [entry for n in instances for entry in self.driver_pool.pop(n, ())]
+			launches = [launch for n in instances for launch in self.prelaunched_drivers.pop(n, ())]
+		entries += [entry for entry in (launch.get() for launch in launches) if entry is not None]
+		for entry in entries:
+			self.quit_driver(entry)
+
+	def get_http_session(self, instance_num):
+		'''Returns the pooled HTTP session of a Tor instance, a urllib3 PoolManager proxied through its SOCKS port.
+		Connections are kept alive and reused across actions until the next IP rotation.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			SOCKSProxyManager: The HTTP session of the instance.'''
+		with self.driver_pool_lock:
+			session = self.http_sessions.get(instance_num)
+			if session is None:
+				session = SOCKSProxyManager(
+					f'socks5h://127.0.0.1:{self.socks_port(instance_num)}',
+					headers={'User-Agent': self.user_agent or choice(USER_AGENTS)},
+					timeout=30,
+					retries=False)
+				self.http_sessions[instance_num] = session
+			return session
+
+	def reset_http_session(self, instance_num):
+		'''Closes the pooled connections of the HTTP session of a Tor instance,
+		so requests after a rotation are not sent over streams of the previous circuit.
+		Args:
+			instance_num (int): The index of the Tor instance.'''
+		with self.driver_pool_lock:
+			session = self.http_sessions.pop(instance_num, None)
+		if session is not None:
+			session.clear()
+
 	def rotate_tor_ip(self, instance_num):
 		'''Rotates the IP address of a Tor instance by sending the NEWNYM signal.
+		Returns as soon as tor reports a fresh circuit instead of sleeping a fixed amount of time.
+		Instances sharing a Tor process close their own circuits instead, leaving their siblings untouched.
 		Args:
 			instance_num (int): The index of the Tor instance.
 		Returns:
 			bool: True if the IP was successfully rotated, False otherwise.'''
-		control_port = self.tor_control_base_port + instance_num * 10
-		if self.is_port_open(control_port):
+		start = time()
+		try:
+			if self.instances_per_process > 1:
+				self.close_instance_circuits(self.get_controller(instance_num), instance_num)
+				self.exits.clear_exit(instance_num)
+			else:
+				self.send_newnym(self.get_controller(instance_num), instance_num)
+			self.reset_http_session(instance_num)
+			self.metrics.observe('rotation', time() - start, instance_num)
+			self.log(f'[+] IP rotated for Tor instance {instance_num}.')
+			return True
+		except Exception as e:
+			self.metrics.increment('rotation_failures', instance_num)
+			self.log(f'[-] Failed to rotate IP for instance {instance_num}: {e}')
+			return False
+
+	def send_newnym(self, controller, instance_num):
+		'''Sends the NEWNYM signal and waits until a circuit launched after it has been built.
+		The wait is bounded by rotation_timeout, in case tor does not build circuits preemptively.
+		With exit_reuse_window, fresh circuits exiting through a recently used relay are closed
+		and replaced by a new one, up to max_exit_rerolls times.
+		Args:
+			controller (Controller): The controller of the Tor instance.
+			instance_num (int): The index of the Tor instance.'''
+		if not controller.is_newnym_available():
+			# tor delays NEWNYM signals sent less than 10 seconds apart
+			sleep(controller.get_newnym_wait())
+		launched = set()
+		built = Queue()
+		def on_circuit(event):
+			if event.purpose != CircPurpose.GENERAL:
+				return
+			if event.status == CircStatus.LAUNCHED:
+				launched.add(event.id)
+			elif event.status == CircStatus.BUILT and event.id in launched:
+				built.put(event.id)
+		controller.add_event_listener(on_circuit, EventType.CIRC)
+		try:
+			start = time()
+			self.exits.clear_exit(instance_num)
+			controller.signal(Signal.NEWNYM)
+			rerolls = 0
+			while True:
+				try:
+					circ_id = built.get(timeout=max(0, start + self.rotation_timeout - time()))
+				except Empty:
+					self.log(f'[~] No fresh circuit reported by Tor instance {instance_num} within {self.rotation_timeout}s.')
+					break
+				exit_relay = self.exits.assign(instance_num, self.process_num(instance_num), circ_id)
+				if (exit_relay is None or self.exit_reuse_window is None or rerolls >= self.max_exit_rerolls
+						or not self.exits.recently_used(exit_relay[0], self.exit_reuse_window)):
+					break
+				rerolls += 1
+				self.log(f'[~] Exit {exit_relay[1]} of Tor instance {instance_num} was used recently, building another circuit...')
+				self.metrics.increment('exit_rerolls', instance_num)
+				self.exits.clear_exit(instance_num)
+				try:
+					controller.close_circuit(circ_id)
+				except InvalidArguments:
+					pass
+				# Ask for a replacement rather than waiting for tor to build one when a stream needs it
+				launched.add(controller.new_circuit())
+			self.metrics.observe('newnym', time() - start, instance_num)
+			self.health.record_circuit(instance_num, time() - start)
+		finally:
+			controller.remove_event_listener(on_circuit)
+
+	def track_circuit(self, process_num, event):
+		'''Records the exit relay of each general circuit built by a Tor process.
+		Args:
+			process_num (int): The index of the Tor process.
+			event (CircuitEvent): The CIRC event reported by tor.'''
+		if event.status == CircStatus.BUILT and event.purpose == CircPurpose.GENERAL:
+			self.exits.circuit_built(process_num, event.id, event.path)
+		elif event.status in (CircStatus.CLOSED, CircStatus.FAILED):
+			self.exits.circuit_closed(process_num, event.id)
+
+	def track_stream(self, process_num, event):
+		'''Records the circuits carrying the streams of each instance, and with them the exit the instance uses.
+		Streams of a shared Tor process are matched to instances through the SessionGroup of the SocksPort they came from.
+		Args:
+			process_num (int): The index of the Tor process.
+			event (StreamEvent): The STREAM event reported by tor.'''
+		if not event.circ_id or event.status not in (StreamStatus.SENTCONNECT, StreamStatus.SUCCEEDED):
+			return
+		if self.instances_per_process > 1:
+			session_group = event.keyword_args.get('SESSION_GROUP')
+			if session_group is None:
+				return
+			instance_num = int(session_group)
+			with self.circuits_lock:
+				self.instance_circuits.setdefault(instance_num, set()).add(event.circ_id)
+		else:
+			instance_num = process_num
+		if self.exits.assign(instance_num, process_num, event.circ_id) is None:
+			# The circuit was built before its events were tracked
+			try:
+				circuit = self.get_controller(instance_num).get_circuit(event.circ_id)
+			except Exception:
+				return
+			self.exits.circuit_built(process_num, circuit.id, circuit.path)
+			self.exits.assign(instance_num, process_num, event.circ_id)
+
+	def exit_info(self, instance_num):
+		'''Returns the exit relay an instance currently goes out through.
+		Args:
+			instance_num (int): The index of the Tor instance.
+		Returns:
+			dict: The 'fingerprint', 'nickname' and 'address' of the exit, or None if it is not known yet.'''
+		exit_relay = self.exits.current(instance_num)
+		if exit_relay is None:
+			return None
+		fingerprint, nickname = exit_relay
+		return {'fingerprint': fingerprint, 'nickname': nickname, 'address': self.exit_address(instance_num, fingerprint)}
+
+	def exit_address(self, instance_num, fingerprint):
+		'''Returns the IP address of an exit relay, looked up once in the consensus of the instance's Tor process.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			fingerprint (str): The fingerprint of the exit relay.
+		Returns:
+			str: The IP address of the relay, or None if it cannot be found.'''
+		address = self.exits.addresses.get(fingerprint)
+		if address is None:
 			try:
-				with Controller.from_port(port=control_port) as controller:
-					controller.authenticate()
-					controller.signal(Signal.NEWNYM)
-				sleep(10)
-				self.log(f'[+] IP rotated for Tor instance {instance_num}.')
-				return True
+				address = self.get_controller(instance_num).get_network_status(fingerprint).address
 			except Exception as e:
-				self.log(f'[-] Failed to rotate IP for instance {instance_num}: {e}')
-				return False
-		else:
-			self.log(f'[-] Control port {control_port} not accessible for instance {instance_num}.')
-			return False
+				self.log(f'[-] Failed to look up the address of exit {fingerprint}: {e}')
+				return None
+			self.exits.addresses[fingerprint] = address
+		return address
+
+	def record_exit(self, action_num, instance_num):
+		'''Records the exit an action went out through in the exit registry.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.'''
+		exit_relay = self.exits.current(instance_num)
+		if exit_relay is not None:
+			self.exits.record_action(action_num, instance_num, self.exit_address(instance_num, exit_relay[0]))
+
+	def close_instance_circuits(self, controller, instance_num):
+		'''Closes every circuit used by an instance, so its next stream is attached to a new circuit.
+		Args:
+			controller (Controller): The controller of the Tor process serving the instance.
+			instance_num (int): The index of the Tor instance.'''
+		with self.circuits_lock:
+			circuits = self.instance_circuits.pop(instance_num, set())
+		for circ_id in circuits:
+			try:
+				controller.close_circuit(circ_id)
+			except InvalidArguments:
+				# The circuit was already closed by tor
+				pass
 
 	def is_port_open(self, port):
 		'''Checks if a specific port is open.
@@ -219,93 +1134,587 @@ class Torsel:
 		'''Load cookies for a specific URL based on the instance number.
 		This method loads cookies from the mapping based on the current URL and instance number.
 		It also ensures the cookies are correctly applied by refreshing the page after loading.
+		With cdp_cookies, the cookies are set before the URL is opened, so the page is loaded once.
 		Args:
 			driver (WebDriver): The Selenium WebDriver instance where cookies will be loaded.
 			instance_num (int): The index of the Tor instance.
 			current_url (str): The current URL being accessed by the WebDriver.'''
 		if self.cookies_mapping:
-			for domain, cookies in self.cookies_mapping.items():
-				if domain in current_url:
-					cookie_file = cookies.get(str(instance_num % len(cookies)))
-					if cookie_file:
-						self.cookies_manager.load_cookies(driver, cookie_file, current_url)
-					break
+			cookie_file = self.cookie_file_for_url(instance_num, current_url)
+			if cookie_file:
+				self.apply_cookies(driver, instance_num, cookie_file, current_url)
 		elif self.cookies_dir:
-			self.cookies_manager.load_cookies(driver, self.cookies_dir, current_url)
+			self.apply_cookies(driver, instance_num, self.cookies_dir, current_url)
 
-	def execute_function(self, action_num, instance_num, user_function):
+	def build_cookies_index(self, cookies_mapping):
+		'''Compiles the cookies mapping into an index of hostnames.
+		Each domain maps to its cookie files ordered by instance slot, so the file of an instance is picked by position.
+		Args:
+			cookies_mapping (dict): Mapping of domains to specific cookie files based on instance number.
+		Returns:
+			dict: Tuples of cookie files (None for missing slots), keyed by lowercase hostname.'''
+		index = {}
+		for domain, cookies in (cookies_mapping or {}).items():
+			host = urlsplit(domain if '://' in domain else f'//{domain}').hostname
+			if host:
+				index.setdefault(host.strip('.'), tuple(cookies.get(str(slot)) for slot in range(len(cookies))))
+		return index
+
+	def cookie_file_for_url(self, instance_num, url):
+		'''Looks up the cookie file of an instance for a URL.
+		The hostname of the URL and then each of its parent domains are looked up in the index, so a mapping
+		for example.com covers www.example.com but not notexample.com, and the most specific domain wins.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			url (str): The URL the cookies are loaded for.
+		Returns:
+			str: The path to the cookie file, or None if the URL is not mapped.'''
+		host = urlsplit(url).hostname
+		if not host:
+			return None
+		labels = host.strip('.').split('.')
+		for start in range(len(labels)):
+			cookie_files = self.cookies_index.get('.'.join(labels[start:]))
+			if cookie_files is not None:
+				return cookie_files[instance_num % len(cookie_files)] if cookie_files else None
+		return None
+
+	def apply_cookies(self, driver, instance_num, cookie_file, url):
+		'''Loads a cookie file into the WebDriver with the configured method.
+		Falls back to loading and refreshing the page if the DevTools injection fails.
+		Args:
+			driver (WebDriver): The Selenium WebDriver instance where cookies will be loaded.
+			instance_num (int): The index of the Tor instance.
+			cookie_file (str): The path to the JSON file containing the cookies.
+			url (str): The URL the cookies are loaded for.'''
+		with self.metrics.timer('cookie_load', instance_num):
+			if self.cdp_cookies and self.cookies_manager.inject_cookies(driver, cookie_file, url):
+				return
+			self.cookies_manager.load_cookies(driver, cookie_file, url)
+
+	def function_params(self, user_function):
+		'''Returns the names of the positional parameters the user function declares.
+		Args:
+			user_function (callable): The function to execute for each action.
+		Returns:
+			tuple: The parameter names.'''
+		return user_function.__code__.co_varnames[:user_function.__code__.co_argcount]
+
+	def uses_browser(self, user_function):
+		'''Checks whether an action needs a browser.
+		Functions asking for the http session but for neither driver nor wait run without launching Chrome.
+		Args:
+			user_function (callable): The function to execute for each action.
+		Returns:
+			bool: True if a WebDriver must be provided, False otherwise.'''
+		params = self.function_params(user_function)
+		return 'http' not in params or 'driver' in params or 'wait' in params
+
+	def build_args(self, user_function, values):
+		'''Selects the arguments Torsel provides that the user function declares as parameters.
+		Args:
+			user_function (callable): The function to execute for each action.
+			values (dict): The values Torsel can provide, keyed by parameter name.
+		Returns:
+			dict: The keyword arguments to call the user function with.'''
+		args = {}
+		for param in self.function_params(user_function):
+			if param in values:
+				args[param] = values[param]
+		return args
+
+	def action_values(self, action_num, instance_num, entry, user_function, work_item=None):
+		'''Returns the values Torsel can inject into the user function for an action.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.
+			entry (dict): The driver entry used by the action, None for browserless actions.
+			user_function (callable): The function to execute for the action.
+			work_item (any, optional): The work item the action was created for.
+		Returns:
+			dict: The injectable values, keyed by parameter name.'''
+		values = {
+			'By': By,
+			'EC': EC,
+			'action_num': action_num,
+			'work_item': work_item,
+			'exit': partial(self.exit_info, instance_num),
+			'instance_num': instance_num,
+			'log': self.log
+		}
+		if entry is not None:
+			values['driver'] = entry['driver']
+			values['wait'] = entry['wait']
+		if 'http' in self.function_params(user_function):
+			values['http'] = self.get_http_session(instance_num)
+		return values
+
+	def execute_function(self, action_num, instance_num, user_function, work_item=None):
+		'''Executes the user function for an action, retrying on a rotated IP when it fails.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.
+			user_function (callable): The function to execute.
+			work_item (any, optional): The work item the action was created for.
+		Returns:
+			tuple: The return value of the user function (or the exception of the last attempt)
+				and the timings of the action in seconds (driver, function, attempts).'''
+		timings = self.start_action(instance_num)
+		result = None
 		max_retries = 3
 		for attempt in range(max_retries):
+			entry = None
+			failed = False
+			timings['attempts'] += 1
 			try:
-				driver, wait, By, EC = self.configure_selenium_with_tor(instance_num)
-				args = {}
-				for param in user_function.__code__.co_varnames[:user_function.__code__.co_argcount]:
-					if param == 'driver':
-						args['driver'] = driver
-					elif param == 'wait':
-						args['wait'] = wait
-					elif param == 'By':
-						args['By'] = By
-					elif param == 'EC':
-						args['EC'] = EC
-					elif param == 'action_num':
-						args['action_num'] = action_num
-					elif param == 'instance_num':
-						args['instance_num'] = instance_num
-					elif param == 'log':
-						args['log'] = self.log
-				user_function(**args)
+				if self.uses_browser(user_function):
+					start = time()
+					entry = self.acquire_driver(instance_num)
+					self.driver_acquired(instance_num, entry, timings, start)
+				values = self.action_values(action_num, instance_num, entry, user_function, work_item)
+				start = time()
+				try:
+					result = user_function(**self.build_args(user_function, values))
+				finally:
+					self.function_returned(instance_num, timings, start)
+				self.health.record_success(instance_num, time() - start)
 				break
 			except Exception as e:
-				self.log(f'[-] Function error: {e}')
-				if attempt < max_retries - 1:
-					self.log(f'Retrying... (Attempt {attempt + 2}/{max_retries})')
-					self.rotate_tor_ip(instance_num)
-				else:
-					self.log(f'Max retries reached for action {action_num}, instance {instance_num}')
+				failed = True
+				result = e
+				if not self.attempt_failed(action_num, instance_num, e, attempt, max_retries):
+					break
+				self.rotate_tor_ip(instance_num)
 			finally:
-				driver.quit()
+				if entry is not None:
+					self.release_driver(instance_num, entry, reusable=not failed)
+		self.record_exit(action_num, instance_num)
+		return result, timings
+
+	def start_action(self, instance_num):
+		'''Counts an action and returns its timings, filled in by each attempt.
+		Args:
+			instance_num (int): The index of the Tor instance running the action.
+		Returns:
+			dict: The seconds spent acquiring a driver and in the user function, and the number of attempts.'''
+		self.metrics.increment('actions', instance_num)
+		return {'driver': 0.0, 'function': 0.0, 'attempts': 0}
+
+	def driver_acquired(self, instance_num, entry, timings, start):
+		'''Records the time an attempt took to acquire its driver and starts prelaunching the next one.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			entry (dict): The driver entry acquired.
+			timings (dict): The timings of the action.
+			start (float): When the attempt started acquiring the driver.'''
+		timings['driver'] += time() - start
+		if self.prelaunch_drivers:
+			self.prelaunch_driver(instance_num, entry)
 
-	def thread_manager(self, queue, user_function, check_stop_func=None):
+	def function_returned(self, instance_num, timings, start):
+		'''Records the time an attempt spent in the user function, whether it returned or raised.
+		Args:
+			instance_num (int): The index of the Tor instance.
+			timings (dict): The timings of the action.
+			start (float): When the user function was called.'''
+		timings['function'] += time() - start
+		self.metrics.observe('user_function', time() - start, instance_num)
+
+	def attempt_failed(self, action_num, instance_num, error, attempt, max_retries):
+		'''Records a failed attempt of an action and decides whether it is retried.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.
+			error (Exception): The exception raised by the attempt.
+			attempt (int): The index of the attempt.
+			max_retries (int): The number of attempts an action gets.
+		Returns:
+			bool: True if the action is to be retried once the IP of the instance is rotated, False otherwise.'''
+		self.log(f'[-] Function error: {error}')
+		self.health.record_failure(instance_num, is_proxy_error(error))
+		if self.health.proxy_dead(instance_num):
+			self.log(f'[-] Proxy of Tor instance {instance_num} is failing, not retrying action {action_num} on it.')
+			self.metrics.increment('failures', instance_num)
+			return False
+		if attempt < max_retries - 1:
+			self.log(f'Retrying... (Attempt {attempt + 2}/{max_retries})')
+			self.metrics.increment('retries', instance_num)
+			return True
+		self.log(f'Max retries reached for action {action_num}, instance {instance_num}')
+		self.metrics.increment('failures', instance_num)
+		return False
+
+	def lease_instance(self, action_num, block=True):
+		'''Leases an idle, ready Tor instance to an action, waiting until one is available.
+		The idle instance with the best health score is handed out, instances without enough history ranking as the median of the pool.
+		Ties go to the instance idle for the longest time.
+		Args:
+			action_num (int): The number of the action the instance is leased to.
+			block (bool): If False, return None right away when no instance is idle.
+		Returns:
+			int: The index of the leased Tor instance, or None if no instance can become ready anymore.'''
+		with self.instances_ready:
+			if block:
+				self.instances_ready.wait_for(lambda: self.idle_instances or self.pool_exhausted())
+			if not self.idle_instances:
+				return None
+			instance_num = min(self.idle_instances, key=self.health.score)
+			self.idle_instances.remove(instance_num)
+			self.leases[instance_num] = action_num
+			return instance_num
+
+	def pool_exhausted(self):
+		'''Checks whether no Tor instance is ready or will become ready, so leasing would wait forever.
+		Must be called while holding instances_ready.
+		Returns:
+			bool: True if the pool has no ready instance and none is bootstrapping or rotating.'''
+		if self.ready_instances or self.leases:
+			return False
+		return all(event.is_set() for event in self.instance_events.values())
+
+	def release_instance(self, instance_num):
+		'''Ends the lease of a Tor instance and rotates its IP in the background.
+		The instance becomes idle again once the rotation is over, or is recreated if the rotation failed.
+		Args:
+			instance_num (int): The index of the Tor instance.'''
+		t = Thread(target=self.recycle_instance, args=(instance_num,))
+		with self.instances_ready:
+			self.recycle_threads = [thread for thread in self.recycle_threads if thread.is_alive()]
+			self.recycle_threads.append(t)
+		t.start()
+
+	def recycle_instance(self, instance_num):
+		'''Rotates the IP of a released Tor instance and makes it idle again.
+		Instances whose health record shows a dead proxy, a low success rate or a slow guard are rebuilt instead.
+		Instances sharing a Tor process with others only drop their circuits, so their siblings are not disrupted.
+		Args:
+			instance_num (int): The index of the Tor instance.'''
+		ready = False
+		try:
+			reason = self.health.verdict(instance_num)
+			if reason:
+				self.metrics.increment('quarantines', instance_num)
+			if reason and self.instances_per_process == 1:
+				self.log(f'[-] Tor instance {instance_num} is unhealthy ({reason}). Rebuilding it with fresh guards.')
+				ready = self.restart_tor_instance(instance_num, fresh_guards=True)
+			else:
+				if reason:
+					self.log(f'[-] Tor instance {instance_num} is unhealthy ({reason}). Dropping its circuits.')
+					self.health.reset([instance_num])
+				ready = self.rotate_tor_ip(instance_num)
+				if not ready:
+					self.log(f'[-] Failed to rotate IP for instance {instance_num}. Recreating Tor instance.')
+					self.metrics.increment('restarts', instance_num)
+					ready = self.restart_tor_instance(instance_num)
+		except Exception as e:
+			self.log(f'[-] Failed to recycle Tor instance {instance_num}: {e}')
+		finally:
+			# Always end the lease, or workers wait for this instance forever
+			with self.instances_ready:
+				del self.leases[instance_num]
+				# A restart of the process in progress makes its instances idle again itself
+				restarting = self.process_num(instance_num) in self.restarting_processes
+				if ready and not restarting and instance_num not in self.idle_instances:
+					self.idle_instances.append(instance_num)
+				elif not ready and not restarting:
+					self.ready_instances.discard(instance_num)
+				self.notify_instances()
+
+	def notify_instances(self):
+		'''Wakes up the threads and coroutines waiting for a Tor instance to become idle or the pool to be exhausted.
+		Must be called while holding instances_ready.'''
+		self.instances_ready.notify_all()
+		for released, loop in self.lease_waiters.items():
+			loop.call_soon_threadsafe(released.set)
+		self.lease_waiters.clear()
+
+	def get_leases(self):
+		'''Returns a snapshot of the lease table.
+		Returns:
+			dict: The action number each leased Tor instance is working on, keyed by instance number.'''
+		with self.instances_ready:
+			return dict(self.leases)
+
+	def thread_manager(self, source, user_function, check_stop_func=None, results=None):
 		'''Manages the execution of threads, ensuring that actions are processed concurrently.
+		Each action runs on an idle, ready Tor instance leased from the pool.
 		Args:
-			queue (Queue): The queue containing action numbers.
+			source (ActionSource): The source the actions are taken from.
 			user_function (callable): The function to execute for each action.
-			check_stop_func (callable, optional): A function to check if execution should stop.'''
-		while not queue.empty():
-			action_num = queue.get()
-			instance_num = action_num % self.total_instances
-			if instance_num not in self.tor_processes:
-				self.create_tor_instance(instance_num)
-			self.execute_function(action_num, instance_num, user_function)
-			if not self.rotate_tor_ip(instance_num):
-				self.log(f'[-] Failed to rotate IP for instance {instance_num}. Recreating Tor instance.')
-				self.create_tor_instance(instance_num)
-			queue.task_done()
-			if check_stop_func and check_stop_func():
-				while not queue.empty():
-					queue.get_nowait()
-					queue.task_done()
-				break
+			check_stop_func (callable, optional): A function to check if execution should stop.
+			results (Queue, optional): A queue receiving (action_num, instance_num, result, timings) for each action,
+				followed by None once this thread is done.'''
+		try:
+			while True:
+				action = source.next()
+				if action is None:
+					break
+				action_num, work_item = action
+				start = time()
+				instance_num = self.lease_instance(action_num)
+				lease_time = time() - start
+				if instance_num is None:
+					self.log(f'[-] Skipping action {action_num}: no Tor instance is available.')
+					result, timings = RuntimeError('No Tor instance is available'), {'attempts': 0}
+				else:
+					result, timings = self.execute_function(action_num, instance_num, user_function, work_item)
+					self.release_instance(instance_num)
+				if results is not None:
+					timings['lease'] = lease_time
+					timings['total'] = time() - start
+					results.put((action_num, instance_num, result, timings))
+				if check_stop_func and check_stop_func():
+					source.stop()
+					break
+		finally:
+			if results is not None:
+				results.put(None)
+
+	def action_source(self, num_actions):
+		'''Returns the source of the actions of a run.
+		Args:
+			num_actions (int, iterable or ActionSource): The number of actions, the work items, or a ready source.
+		Returns:
+			ActionSource: The source the workers take their actions from.'''
+		if isinstance(num_actions, ActionSource):
+			return num_actions
+		return ActionSource(num_actions, 2 * self.max_threads, self.log)
 
 	def run(self, num_actions, user_function, check_stop_func=None):
 		'''Runs the specified number of actions concurrently across the available Tor instances.
 		This method is the main entry point for executing tasks across multiple Tor instances. It handles
 		the initialization, threading, and cleanup process to ensure smooth operation.
+		Inside a with block (or between start and close), the running instances are reused instead.
 		Args:
-			num_actions (int): The number of actions to perform.
+			num_actions (int or iterable): The number of actions to perform, or an iterable of work items
+				consumed lazily, one action per item, injected into the user function as work_item.
 			user_function (callable): The function to execute for each action.
 			check_stop_func (callable, optional): A function to check if execution should stop.'''
-		self.clean_up()
-		queue = Queue()
-		for i in range(num_actions):
-			queue.put(i)
+		warmup_threads = self.prepare_run()
+		source = self.action_source(num_actions)
+		threads = []
+		for _ in range(source.workers(self.max_threads)):
+			t = Thread(target=self.thread_manager, args=(source, user_function, check_stop_func))
+			t.start()
+			threads.append(t)
+		self.finish_run(threads + warmup_threads)
+
+	def imap(self, num_actions, user_function, check_stop_func=None, buffer_size=None):
+		'''Runs actions like run, yielding the outcome of each action as soon as it completes.
+		Results are handed over through a bounded buffer: when the consumer falls behind,
+		workers block until it catches up, so memory stays flat however many actions are run.
+		Leaving the loop early stops the remaining actions and cleans up the Tor instances, unless they were started with start.
+		Args:
+			num_actions (int or iterable): The number of actions to perform, or an iterable of work items.
+			user_function (callable): The function to execute for each action.
+			check_stop_func (callable, optional): A function to check if execution should stop.
+			buffer_size (int, optional): Maximum number of pending results, by default 2 * max_threads.
+		Yields:
+			tuple: (action_num, instance_num, result, timings), where result is the return value of the
+				user function or the exception of its last attempt, and timings holds the seconds spent
+				leasing an instance, acquiring a driver, in the user function and in total.'''
+		warmup_threads = self.prepare_run()
+		source = self.action_source(num_actions)
+		results = Queue(maxsize=buffer_size or 2 * self.max_threads)
 		threads = []
-		for _ in range(min(num_actions, self.max_threads)):
-			t = Thread(target=self.thread_manager, args=(queue, user_function, check_stop_func))
+		for _ in range(source.workers(self.max_threads)):
+			t = Thread(target=self.thread_manager, args=(source, user_function, check_stop_func, results))
 			t.start()
 			threads.append(t)
+		running = len(threads)
+		try:
+			while running:
+				item = results.get()
+				if item is None:
+					running -= 1
+				else:
+					yield item
+		finally:
+			if running:
+				source.stop()
+				# Keep emptying the buffer so workers blocked on it can reach the next action
+				while running:
+					if results.get() is None:
+						running -= 1
+			self.finish_run(threads + warmup_threads)
+
+	def join_threads(self, threads):
+		'''Waits for the given threads, then for every background rotation still in progress.
+		Args:
+			threads (list): The threads to join.'''
 		for t in threads:
 			t.join()
-		self.clean_up()
+		# Releases made while joining spawn new rotations, join until none is left
+		while True:
+			with self.instances_ready:
+				pending = [t for t in self.recycle_threads if t.is_alive()]
+			if not pending:
+				break
+			for t in pending:
+				t.join()
+
+	async def arun(self, num_actions, user_function, check_stop_func=None, executor_threads=None):
+		'''Asynchronous counterpart of run, coordinating every action from a single event loop.
+		Up to max_threads actions are in flight at the same time without one thread per action.
+		Blocking work (Tor bootstrap, controller calls, browser launch and quit, synchronous user functions)
+		is offloaded to a bounded thread pool. An async user function runs on the event loop and can
+		offload its own blocking Selenium calls with the injected run_sync helper, e.g. await run_sync(driver.get, url).
+		Args:
+			num_actions (int or iterable): The number of actions to perform, or an iterable of work items.
+			user_function (callable): The function or coroutine function to execute for each action.
+			check_stop_func (callable, optional): A function to check if execution should stop.
+			executor_threads (int, optional): Size of the thread pool for blocking calls, by default min(32, max_threads).'''
+		loop = get_running_loop()
+		executor = ThreadPoolExecutor(max_workers=executor_threads or min(32, self.max_threads))
+		prepare = loop.run_in_executor(executor, self.prepare_run)
+		workers = []
+		recycler = None
+		try:
+			await shield(prepare)
+			source = self.action_source(num_actions)
+			count = source.workers(self.max_threads)
+			actions = AsyncQueue()
+			credits = Semaphore(count)
+			# One thread per worker, as many as leases: a restart waiting for leased siblings never starves their recycling
+			recycler = ThreadPoolExecutor(max_workers=max(1, count), thread_name_prefix='torsel-recycle')
+			workers = [ensure_future(self.async_manager(source, actions, credits, user_function, check_stop_func, executor, recycler))
+				for _ in range(count)]
+			if workers:
+				Thread(target=self.async_reader, args=(source, actions, credits, loop), daemon=True).start()
+			await gather(*workers)
+		finally:
+			# Tor processes must not outlive a run that failed or was cancelled
+			if workers:
+				source.stop()
+				credits.release()
+				await gather(*workers, return_exceptions=True)
+			# A cancelled warm-up goes on in the background, wait for it before cleaning up
+			await wait([prepare])
+			warmup_threads = [] if prepare.exception() else prepare.result()
+			if recycler is not None:
+				await loop.run_in_executor(executor, recycler.shutdown)
+			await loop.run_in_executor(executor, self.finish_run, warmup_threads)
+			executor.shutdown(wait=False)
+
+	def async_reader(self, source, actions, credits, loop):
+		'''Reads the actions of arun from the source on a dedicated thread, so a slow source never holds
+		the threads of the executor. At most one action per worker is read ahead.
+		Args:
+			source (ActionSource): The source the actions are taken from.
+			actions (asyncio.Queue): The queue the workers take the actions from, ended by None.
+			credits (Semaphore): Released by the workers for each action they take.
+			loop (AbstractEventLoop): The event loop running the workers.'''
+		while True:
+			credits.acquire()
+			action = source.next()
+			try:
+				loop.call_soon_threadsafe(actions.put_nowait, action)
+			except RuntimeError:
+				# The event loop is closed, nobody is left to take the action
+				return
+			if action is None:
+				return
+
+	async def async_manager(self, source, actions, credits, user_function, check_stop_func, executor, recycler):
+		'''Event loop counterpart of thread_manager, processing actions until the source is exhausted.
+		Args:
+			source (ActionSource): The source the actions are taken from.
+			actions (asyncio.Queue): The actions read from the source by async_reader.
+			credits (Semaphore): Released for each action taken, letting async_reader read the next one.
+			user_function (callable): The function or coroutine function to execute for each action.
+			check_stop_func (callable, optional): A function to check if execution should stop.
+			executor (ThreadPoolExecutor): The thread pool for blocking calls.
+			recycler (ThreadPoolExecutor): The thread pool rotating the IP of the released instances.'''
+		loop = get_running_loop()
+		while True:
+			action = await actions.get()
+			credits.release()
+			if action is None or source.stopped.is_set():
+				# Leave the marker for the other workers
+				actions.put_nowait(None)
+				break
+			action_num, work_item = action
+			instance_num = await self.async_lease_instance(action_num)
+			if instance_num is None:
+				self.log(f'[-] Skipping action {action_num}: no Tor instance is available.')
+			else:
+				try:
+					await self.async_execute_function(action_num, instance_num, user_function, executor, work_item)
+				finally:
+					# Counterpart of release_instance, without a new thread for each action
+					loop.run_in_executor(recycler, self.recycle_instance, instance_num)
+			if check_stop_func and check_stop_func():
+				source.stop()
+				break
+
+	async def async_lease_instance(self, action_num):
+		'''Leases an idle, ready Tor instance without blocking the event loop.
+		Waits for notify_instances to signal a release instead of polling the pool.
+		Args:
+			action_num (int): The number of the action the instance is leased to.
+		Returns:
+			int: The index of the leased Tor instance, or None if no instance can become ready anymore.'''
+		loop = get_running_loop()
+		while True:
+			released = AsyncEvent()
+			with self.instances_ready:
+				instance_num = self.lease_instance(action_num, block=False)
+				if instance_num is not None or self.pool_exhausted():
+					return instance_num
+				# Registered while holding the lock, so a release right after is not missed
+				self.lease_waiters[released] = loop
+			try:
+				await released.wait()
+			finally:
+				with self.instances_ready:
+					self.lease_waiters.pop(released, None)
+
+	async def async_execute_function(self, action_num, instance_num, user_function, executor, work_item=None):
+		'''Event loop counterpart of execute_function.
+		Synchronous user functions run entirely on the thread pool, coroutine functions are awaited on the loop.
+		Args:
+			action_num (int): The number of the action.
+			instance_num (int): The index of the Tor instance.
+			user_function (callable): The function or coroutine function to execute.
+			executor (ThreadPoolExecutor): The thread pool for blocking calls.
+			work_item (any, optional): The work item the action was created for.
+		Returns:
+			tuple: The result of the action and its timings, as returned by execute_function.'''
+		loop = get_running_loop()
+		if not iscoroutinefunction(user_function):
+			return await loop.run_in_executor(
+				executor, self.execute_function, action_num, instance_num, user_function, work_item)
+		run_sync = lambda func, *args: loop.run_in_executor(executor, partial(func, *args))
+		timings = self.start_action(instance_num)
+		result = None
+		max_retries = 3
+		for attempt in range(max_retries):
+			entry = None
+			failed = False
+			timings['attempts'] += 1
+			try:
+				if self.uses_browser(user_function):
+					start = time()
+					entry = await run_sync(self.acquire_driver, instance_num)
+					self.driver_acquired(instance_num, entry, timings, start)
+				values = self.action_values(action_num, instance_num, entry, user_function, work_item)
+				values['run_sync'] = run_sync
+				start = time()
+				try:
+					result = await user_function(**self.build_args(user_function, values))
+				finally:
+					self.function_returned(instance_num, timings, start)
+				self.health.record_success(instance_num, time() - start)
+				break
+			except Exception as e:
+				failed = True
+				result = e
+				if not self.attempt_failed(action_num, instance_num, e, attempt, max_retries):
+					break
+				await run_sync(self.rotate_tor_ip, instance_num)
+			finally:
+				if entry is not None:
+					await run_sync(self.release_driver, instance_num, entry, not failed)
+		await run_sync(self.record_exit, action_num, instance_num)
+		return result, timings
 # by azuk4r
\ No newline at end of file